@@ -1,10 +1,14 @@
 import flet as ft
-import numpy as np
 import random
-from itertools import chain 
+import argparse
+import logging
+from bitboard import BitBoard, get_flips, get_moves, iter_squares, popcount, square_index, square_pos
+from board_view import BORDER_NORMAL, BoardView
+from game_trace import GameTrace, LazyFormat, configure_logging, format_board, logger
 
 class OthelloGame:
-    def __init__(self):
+    #traceにGameTraceを渡すと、このゲームの手をリングバッファに記録する(Noneなら記録しない)
+    def __init__(self, trace=None):
         self.board_size = 8
         self.DIRECTIONS = [
             (-1, 0),  # 上
@@ -16,6 +20,7 @@ class OthelloGame:
             (1, -1),  # 左下
             (1, 1),   # 右下
         ]
+        self.trace = trace
         self.initialize_game()
 
     #先行を決める
@@ -23,69 +28,64 @@ class OthelloGame:
         #-1で黒が先行、1で白が先行
         return random.choice([-1, 1])
     
-    #オセロの状態を初期化
+    #オセロの状態を初期化(白と黒のビットボード、座標は1始まり)
     def initialize_board(self):
-        board = np.full((self.board_size+2, self.board_size+2), "w", dtype=object)
-        board[1: -1, 1: -1] = 0
-        center = self.board_size // 2
-        board[center, center] = 1
-        board[center+1, center+1] = 1
-        board[center, center+1] = -1
-        board[center+1, center] = -1
-
-        for row in board:
-            print(" ".join(f"{str(cell):>2}" for cell in row))
-        
-        return board
+        return BitBoard.initial()
     
     #ゲームの初期化
     def initialize_game(self):
         self.current_player = -1
-        print(self.current_player)
+        self.passed = False
         self.board_state = self.initialize_board()
         self.valid_moves = self.find_valid_moves(self.board_state, self.current_player)
-        print(self.valid_moves)
         self.white_count, self.black_count = self.count_stones(self.board_state)
-        print("石の数", self.white_count, self.black_count)
+        if self.trace is not None:
+            self.trace.clear()
+            self.trace.record("start", self.current_player)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("new game first=%d valid=%s\n%s", self.current_player, self.valid_moves,
+                         LazyFormat(format_board, self.board_state))
     
     #オセロの状態を更新
+    #手番も進める 相手が置けなければもう一度自分の番(passedがTrue)、どちらも置けなければcurrent_playerは0
     def update_state(self, row, col):
-        #石が置かれた場所の状態を更新
-        if self.current_player == 1:
-            self.board_state[row][col] = 1
-        else:
-            self.board_state[row][col] = -1
-
-        #ひっくり返せる場所を更新
-        self.flippable_pos = self.find_flippable(self.board_state, row, col, self.current_player)
-        for row, col in self.flippable_pos:
-            if self.current_player == 1:
-                self.board_state[row][col] = 1
-            else:
-                self.board_state[row][col] = -1
-
-        for row in self.board_state:
-            print(" ".join(f"{str(cell):>2}" for cell in row))
+        move_row, move_col = row, col
+        #石を置いてひっくり返せる石を返す
+        sq = square_index(row, col)
+        p, o = self.board_state.split(self.current_player)
+        flips = get_flips(p, o, sq)
+        self.board_state.set_split(self.current_player, p | flips | (1 << sq), o ^ flips)
+        self.flippable_pos = [square_pos(f) for f in iter_squares(flips)]
 
         #石の数を数える
         self.white_count, self.black_count = self.count_stones(self.board_state)
         
         #次のプレイヤーのひっくり返せる場所を探す。
+        mover = self.current_player
         next_player = self.change_player(self.current_player)
         self.valid_moves = self.find_valid_moves(self.board_state, next_player)
+        if self.trace is not None:
+            self.trace.record("move", mover, (move_row, move_col), self.flippable_pos)
 
         #次のプレイヤーが置ける場所がない場合スキップ
-        if not self.valid_moves:
-            next_player = self.change_player(self.current_player)
+        self.passed = not self.valid_moves
+        if self.passed:
+            if self.trace is not None:
+                self.trace.record("pass", next_player)
+            next_player = mover
             self.valid_moves = self.find_valid_moves(self.board_state, next_player)
 
             if not self.valid_moves:
-                self.current_player = 0
+                next_player = 0
                 #最後の集計
                 self.white_count, self.black_count = self.count_stones(self.board_state)
-        
+                if self.trace is not None:
+                    self.trace.record("end", self.white_count, self.black_count)
+        self.current_player = next_player
 
-        print(self.valid_moves)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("move player=%d at=(%d, %d) flips=%s valid=%s\n%s", mover, move_row, move_col,
+                         self.flippable_pos, self.valid_moves, LazyFormat(format_board, self.board_state))
 
     def change_player(self, current_player):
         next_player = current_player * -1
@@ -93,68 +93,27 @@ class OthelloGame:
     
     #石を置けるかの判定
     def can_place_stone(self, board, row, col, player):
-
+        sq = square_index(row, col)
         #すでに石が置かれている場合は置けない
-        if board[row][col] != 0:
+        if ((board.white | board.black) >> sq) & 1:
             return False
-        
-        for dr, dc in self.DIRECTIONS:
-            r, c = row + dr, col + dc
-            #隣のマスが相手の石でなければ無効
-            if board[r][c] != -player:
-                continue
-            
-            #相手の石が終わるまで進む
-            while board[r][c] == -player:
-                r += dr
-                c += dc
-            
-            #ループの終了時、自分の石にいたら有効
-            if board[r][c] == player:
-                return True
-            
-        #どれも無効の場合は置けない
-        return False
+        p, o = board.split(player)
+        return get_flips(p, o, sq) != 0
     
     #全体から有効なマスを探す
     def find_valid_moves(self, board, player):
-        valid_moves = []
-        for row in range(1, len(board) - 1):
-            for col in range(1, len(board) - 1):
-                if self.can_place_stone(board, row, col, player):
-                    valid_moves.append((row, col))
-        
+        p, o = board.split(player)
         #有効なマスのインデックスを返す
-        return valid_moves
+        return [square_pos(sq) for sq in iter_squares(get_moves(p, o))]
     
     #ひっくり返せる場所を探す
     def find_flippable(self, board, row, col, player):
-        filippable_pos = []
-
-        for dr, dc in self.DIRECTIONS:
-            r, c = row + dr, col + dc
-            temp_pos = []
-
-            # 隣が相手の石でなければ次の方向へ
-            while board[r][c] == -player:
-                temp_pos.append((r, c))
-                r += dr
-                c += dc
-
-            # 自分の石に到達した場合だけひっくり返せる
-            if board[r][c] == player:
-                filippable_pos.extend(temp_pos)
-
-        print(filippable_pos)
-        return filippable_pos
+        p, o = board.split(player)
+        return [square_pos(sq) for sq in iter_squares(get_flips(p, o, square_index(row, col)))]
     
     #石の数を数える
     def count_stones(self, board_state):
-        flattened = list(chain.from_iterable(board_state))
-        white_count = flattened.count(1)
-        black_count = flattened.count(-1)
-
-        return white_count, black_count
+        return popcount(board_state.white), popcount(board_state.black)
     
     #勝者を決める　
     def judge_winner(self):
@@ -167,12 +126,14 @@ class OthelloGame:
 
         
 class GUI:
-    def __init__(self, page: ft.Page):
+    #trace_sizeを指定すると、ゲームごとに直近trace_size件の手を記録し、終局時にログへ書き出す
+    def __init__(self, page: ft.Page, trace_size=None):
         self.page = page
         self.page_width = 1000
         self.page_height = 800
         self.grid_size = 8
         self.grid = [] #オセロ盤のUIを保持
+        self.trace_size = trace_size
         self.create_board()
         self.create_buttons()
         self.join_GUI()
@@ -192,7 +153,7 @@ class GUI:
                         width=self.grid_px,
                         height=self.grid_px,
                         bgcolor="green",
-                        border=ft.border.all(2, "black"),
+                        border=BORDER_NORMAL,
                         ink=True,
                         #ここにオセロを置く処理を追加
                         on_click=lambda e, r=row, c=col: self.handle_click(r, c)
@@ -217,6 +178,8 @@ class GUI:
             border_radius=ft.border_radius.all(10),
             alignment=ft.alignment.center
         )
+        #石と枠線は変わったマスだけを書き換える
+        self.view = BoardView(self.grid, self.grid_px // 2)
 
     #ボタン、テキストボックスを作る
     def create_buttons(self):
@@ -320,21 +283,24 @@ class GUI:
     #スタートボタンが押された時、ボードを初期化して石を描画
     def start_game(self, e):
         if self.isgame == False:
-            self.game = OthelloGame()
+            self.game = self.new_game()
             self.initialize_game() 
             self.isgame = True
 
+    #新しいゲームを作る(トレースが有効ならゲームごとにリングバッファを用意する)
+    def new_game(self):
+        trace = GameTrace(self.trace_size) if self.trace_size else None
+        return OthelloGame(trace=trace)
+
     #リセットボタンが押された時の処理
     def reset_game(self, e):
         if self.isgame == True:
-            self.del_valid_moves()
-            self.game = OthelloGame()  # 新しいゲーム状態を作成
-            self.initialize_game()     # ボードを初期化して描画
-            self.del_valid_moves()
+            self.game = self.new_game()  # 新しいゲーム状態を作成
+            self.render(show_moves=False)  # 初期配置を描画(置ける場所は表示しない)
 
             # 情報表示をリセット
-            self.info_text.content = ft.Text("ゲームをリセットしました。スタートボタンを押してください。", size=20)
-            self.othello_count.content = ft.Text("黒: 2\n白: 2", size=20)
+            self.info_text.content.value = "ゲームをリセットしました。スタートボタンを押してください。"
+            self.othello_count.content.value = "黒: 2\n白: 2"
 
             self.isgame = False
             
@@ -344,108 +310,74 @@ class GUI:
     
     #初期化
     def initialize_game(self):
-        print("オセロ盤を更新中...") 
-        for row in range(self.grid_size):
-            for col in range(self.grid_size):
-                #白石
-                if self.game.board_state[row+1][col+1] == 1:
-                    self.grid[row][col].content =  ft.CircleAvatar(radius=self.grid_px // 2, bgcolor="white")
-                    self.grid[row][col].on_click = None
-                #黒石
-                elif self.game.board_state[row+1][col+1] == -1:
-                    self.grid[row][col].content =  ft.CircleAvatar(radius=self.grid_px // 2, bgcolor="black")
-                    self.grid[row][col].on_click = None
-                else:
-                    self.grid[row][col].on_click = lambda e, r=row, c=col: self.handle_click(r, c)
-                    self.grid[row][col].content = None  
+        self.render()
 
         #先行のプレイヤーをinfo_textに表示
         first_player = "白が先行です" if self.game.current_player == 1 else "黒が先行です"
-        self.info_text.content = ft.Text(first_player, size=20)
-
-        #石の数を表示
-        self.othello_count.content = ft.Text(f"黒:{self.game.black_count}\n白:{self.game.white_count}", size=20)
-
-        #石を置ける場所を描画
-        self.draw_valid_moves()
+        self.info_text.content.value = first_player
 
         #ページを更新
         self.page.update() 
 
-    #石を置けるマスを黄色で囲む
-    def draw_valid_moves(self):
-        for row, col in self.game.valid_moves:
-            self.grid[row-1][col-1].border = ft.border.all(2, "yellow")
-    #戻す
-    def del_valid_moves(self):
-        for row, col in self.game.valid_moves:
-            self.grid[row-1][col-1].border = ft.border.all(2, "black")
+    #盤面・石の数・石を置けるマスを描画(ページの更新は呼び出し側でまとめて行う)
+    def render(self, show_moves=True):
+        valid_moves = self.game.valid_moves if show_moves else ()
+        self.view.render(self.game.board_state.get, valid_moves)
+        self.othello_count.content.value = f"黒:{self.game.black_count}\n白:{self.game.white_count}"
 
     #石が置かれる処理
     def handle_click(self, row, col):
         if self.isgame == True:
-            print(f"Clicked row:{row}, col{col}")
+            logger.debug("clicked row=%d col=%d", row, col)
 
             if (row+1, col+1) not in set(self.game.valid_moves):
-                print("ここには置けません！")
+                logger.info("ここには置けません！ row=%d col=%d", row, col)
                 return
-            
-            self.del_valid_moves()
-
-            #クリックされたマスに円を描画
-            self.draw_circle(row, col)
 
-            #オセロの状態を更新
+            #オセロの状態を更新(手番の切り替えとスキップもここで行われる)
             self.game.update_state(row+1, col+1)
-            filippable_pos = self.game.flippable_pos
-            for row, col in filippable_pos:
-                row -= 1
-                col -= 1
-                self.draw_circle(row, col)
-
-            #石の数を表示
-            self.othello_count.content = ft.Text(f"黒:{self.game.black_count}\n白:{self.game.white_count}", size=20)
 
             #次の番へ
-            self.game.current_player = self.game.change_player(self.game.current_player)
             current_player = "白のターンです" if self.game.current_player == 1 else "黒のターンです"
-            self.info_text.content = ft.Text(current_player, size=20)
+            self.info_text.content.value = current_player
 
-            #スキップ
-            if not self.game.valid_moves:
-                skipped_player = "白のターンがスキップされました" if self.game.current_player == 1 else "黒のターンがスキップされました"
-                self.game.current_player = self.game.change_player(self.game.current_player)
-                self.info_text.content = ft.Text(skipped_player+"\n"+current_player, size=20)
+            #終了判定
+            if self.game.current_player == 0:
+                self.info_text.content.value = "両者に置ける場所がないため、ゲーム終了です。" + "\n" + self.game.judge_winner()
+                if self.game.trace is not None:
+                    logger.info("game trace\n%s", LazyFormat(lambda t: "\n".join(t.lines()), self.game.trace))
 
-                #終了判定
-                if self.game.current_player == 0:
-                        self.info_text.content = ft.Text("両者に置ける場所がないため、ゲーム終了です。" + "\n" + self.game.judge_winner(), size=20)
+            #スキップ
+            elif self.game.passed:
+                skipped_player = "黒のターンがスキップされました" if self.game.current_player == 1 else "白のターンがスキップされました"
+                self.info_text.content.value = skipped_player+"\n"+current_player
 
-                
-            #石が置ける場所を描画
-            self.draw_valid_moves()
+            #置いた石・ひっくり返った石・置ける場所をまとめて描画
+            self.render()
 
             #ページの更新
             self.page.update()
-    
-    #石を描画
-    def draw_circle(self, row, col):
-        if self.game.current_player == 1:
-                self.grid[row][col].content = ft.CircleAvatar(radius=self.grid_px // 2, bgcolor="white")
-                self.grid[row][col].on_click = None
-        else:
-            self.grid[row][col].content = ft.CircleAvatar(radius=self.grid_px // 2, bgcolor="black")
-            self.grid[row][col].on_click = None
 
 
 
 
+#ゲームごとに記録する手の数(Noneなら記録しない)
+trace_size = None
+
 def main(page: ft.Page):
-    gui = GUI(page)
+    gui = GUI(page, trace_size=trace_size)
     page.title = "オセロ"
     page.window.width = gui.page_width
     page.window.height = gui.page_height
 
     page.add(gui.gui_container)
 
-ft.app(target=main)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="オセロ")
+    parser.add_argument("--log-level", default="WARNING", help="ログのレベル (DEBUGで毎手の盤面も出力する)")
+    parser.add_argument("--trace", type=int, default=None, metavar="N", help="ゲームごとに直近N件の手を記録し、終局時にINFOで書き出す")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level.upper())
+    trace_size = args.trace
+    ft.app(target=main)
\ No newline at end of file
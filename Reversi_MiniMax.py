@@ -1,217 +1,19 @@
+import argparse
 import flet as ft
-import numpy as np
 import random
-import time  # <-- 2秒待機のため
-from itertools import chain
-
-#オセロの内部を定義
-class OthelloGame:
-    def __init__(self):
-        self.board_size = 8
-        self.DIRECTIONS = [
-            (-1, 0),   # 上
-            (1, 0),    # 下
-            (0, -1),   # 左
-            (0, 1),    # 右
-            (-1, -1),  # 左上
-            (-1, 1),   # 右上
-            (1, -1),   # 左下
-            (1, 1),    # 右下
-        ]
-        self.board_state = None
-        self.current_player = None
-        self.user_player = None
-        self.ai_player = None
-        self.valid_moves = []
-        self.white_count = 0
-        self.black_count = 0
-        self.flippable_pos = []
-
-    #ボードを初期化
-    def initialize_board(self):
-        board = np.full((self.board_size+2, self.board_size+2), "w", dtype=object)
-        board[1:-1, 1:-1] = 0
-        c = self.board_size // 2
-        board[c, c] = 1
-        board[c+1, c+1] = 1
-        board[c, c+1] = -1
-        board[c+1, c] = -1
-        return board
-
-    #ゲームを初期化
-    def initialize_game(self, first_player):
-        self.current_player = first_player
-        self.board_state = self.initialize_board()
-        self.valid_moves = self.find_valid_moves(self.board_state, self.current_player)
-        self.white_count, self.black_count = self.count_stones(self.board_state)
-        self.flippable_pos = []
-
-    #プレイヤーの切り替え
-    def change_player(self, current_player):
-        return -current_player
-
-    #石を数える
-    def count_stones(self, board_state):
-        flat = list(chain.from_iterable(board_state))
-        return flat.count(1), flat.count(-1)
-
-    #石の数から勝者を決める
-    def judge_winner(self):
-        if self.white_count > self.black_count:
-            return "白の勝ちです！"
-        elif self.black_count > self.white_count:
-            return "黒の勝ちです！"
-        else:
-            return "引き分けです！"
-
-    #石を置けるかを判定
-    def can_place_stone(self, board, row, col, player):
-        if board[row][col] != 0:
-            return False
-        for dr, dc in self.DIRECTIONS:
-            r, c = row + dr, col + dc
-            flipped_count = 0
-            while 0 <= r < (self.board_size+2) and 0 <= c < (self.board_size+2) and board[r][c] == -player:
-                r += dr
-                c += dc
-                flipped_count += 1
-            if flipped_count > 0:
-                if 0 <= r < (self.board_size+2) and 0 <= c < (self.board_size+2):
-                    if board[r][c] == player:
-                        return True
-        return False
-
-    #石が置けるマスを探す
-    def find_valid_moves(self, board, player):
-        valid = []
-        for r in range(1, self.board_size+1):
-            for c in range(1, self.board_size+1):
-                if self.can_place_stone(board, r, c, player):
-                    valid.append((r, c))
-        return valid
-
-    #ひっくり返せる場所を探す
-    def find_flippable(self, board, row, col, player):
-        flippable = []
-        for dr, dc in self.DIRECTIONS:
-            r, c = row + dr, col + dc
-            tmp = []
-            while 0 <= r < (self.board_size+2) and 0 <= c < (self.board_size+2) and board[r][c] == -player:
-                tmp.append((r, c))
-                r += dr
-                c += dc
-            if len(tmp) > 0:
-                if 0 <= r < (self.board_size+2) and 0 <= c < (self.board_size+2) and board[r][c] == player:
-                    flippable.extend(tmp)
-        return flippable
-
-    #オセロの状態を更新
-    def update_state(self, row, col):
-        self.board_state[row][col] = self.current_player
-        self.flippable_pos = self.find_flippable(self.board_state, row, col, self.current_player)
-        for (r, c) in self.flippable_pos:
-            self.board_state[r][c] = self.current_player
-
-        self.white_count, self.black_count = self.count_stones(self.board_state)
-
-        nxt = self.change_player(self.current_player)
-        nxt_valid = self.find_valid_moves(self.board_state, nxt)
-        if not nxt_valid:
-            nxt2 = self.change_player(nxt)
-            nxt2_valid = self.find_valid_moves(self.board_state, nxt2)
-            if not nxt2_valid:
-                self.current_player = 0  # 終了
-                self.valid_moves = []
-                return
-            else:
-                self.current_player = nxt2
-                self.valid_moves = nxt2_valid
-        else:
-            self.current_player = nxt
-            self.valid_moves = nxt_valid
-
-    #ミニマックス法を用いたAI
-    def ai_move(self, depth=2):
-        moves = self.find_valid_moves(self.board_state, self.current_player)
-        if not moves:
-            return None
-
-        if self.current_player == 1:
-            best_val = float('-inf')
-        else:
-            best_val = float('inf')
-        best_move = None
-
-        for (r, c) in moves:
-            board_copy = np.copy(self.board_state)
-            self.simulate_move(board_copy, r, c, self.current_player)
-            val = self.minimax(board_copy, depth - 1,
-                               self.change_player(self.current_player),
-                               alpha=float('-inf'), beta=float('inf'))
-            if self.current_player == 1:
-                if val > best_val:
-                    best_val = val
-                    best_move = (r, c)
-            else:
-                if val < best_val:
-                    best_val = val
-                    best_move = (r, c)
-        return best_move
-
-    #ボードの状態をコピー
-    def simulate_move(self, board, row, col, player):
-        board[row][col] = player
-        to_flip = self.find_flippable(board, row, col, player)
-        for (r, c) in to_flip:
-            board[r][c] = player
-
-    #盤面を評価
-    def minimax(self, board, depth, player, alpha, beta):
-        if depth == 0 or self.is_game_over(board):
-            return self.evaluate_board(board)
-        moves = self.find_valid_moves(board, player)
-        if not moves:
-            return self.minimax(board, depth, self.change_player(player), alpha, beta)
-
-        if player == 1:  
-            value = float('-inf')
-            for (r, c) in moves:
-                board_copy = np.copy(board)
-                self.simulate_move(board_copy, r, c, player)
-                value = max(value, self.minimax(board_copy, depth - 1,
-                                                self.change_player(player), alpha, beta))
-                alpha = max(alpha, value)
-                if alpha >= beta:
-                    break
-            return value
-        else:  
-            value = float('inf')
-            for (r, c) in moves:
-                board_copy = np.copy(board)
-                self.simulate_move(board_copy, r, c, player)
-                value = min(value, self.minimax(board_copy, depth - 1,
-                                                self.change_player(player), alpha, beta))
-                beta = min(beta, value)
-                if alpha >= beta:
-                    break
-            return value
-
-    #ゲームオーバー
-    def is_game_over(self, board):
-        v1 = self.find_valid_moves(board, 1)
-        v2 = self.find_valid_moves(board, -1)
-        return (not v1) and (not v2)
-
-    #評価値を計算
-    def evaluate_board(self, board):
-        flat = list(chain.from_iterable(board))
-        w = flat.count(1)
-        b = flat.count(-1)
-        return w - b
+import threading
+import time
+from board_view import BORDER_NORMAL, BoardView
+from engine_pool import EngineBusy, EnginePool, EngineTimeout
+from game_trace import logger
+from minimax_engine import OthelloGame, SearchCancelled
+from opening_book import OpeningBook
 
 #GUIを定義
 class GUI:
-    def __init__(self, page: ft.Page):
+    #engineにEnginePoolを渡すと、AIの手はこのページで読まずに共有のエンジンに依頼する(サーバーモード)
+    #bookにOpeningBookを渡すと、このページで読むときに定跡の局面は定跡の手を打つ
+    def __init__(self, page: ft.Page, engine=None, book=None):
         self.page = page
         self.page_width = 1000
         self.page_height = 800
@@ -222,6 +24,16 @@ class GUI:
         self.join_GUI()
         self.isgame = False
         self.game = None
+        #AIの手番はバックグラウンドのスレッドで考える
+        self.ai_depth = 2
+        self.ai_min_delay = 1.0  # AIが最低限考えているように見せる秒数
+        self.ai_token = 0  # リセットされたら増やして、古いAIの結果を捨てる
+        self.ai_cancel = threading.Event()
+        self.ui_lock = threading.Lock()
+        self.last_progress = 0.0
+        self.engine = engine
+        self.book = book
+        self.session_id = id(self)
 
     #オセロ盤を作成
     def create_board(self):
@@ -237,7 +49,7 @@ class GUI:
                         width=self.grid_px,
                         height=self.grid_px,
                         bgcolor="green",
-                        border=ft.border.all(2, "black"),
+                        border=BORDER_NORMAL,
                         ink=True,
                         on_click=lambda e, r=row, c=col: self.handle_click(r, c)
                     )
@@ -261,6 +73,8 @@ class GUI:
             border_radius=ft.border_radius.all(10),
             alignment=ft.alignment.center
         )
+        #石と枠線は変わったマスだけを書き換える
+        self.view = BoardView(self.grid, self.grid_px // 2)
 
     #ボタンなどを作成
     def create_buttons(self):
@@ -290,6 +104,24 @@ class GUI:
             expand=4,
         )
 
+        #AIが考えている間だけ表示する
+        self.thinking_indicator = ft.Container(
+            content=ft.Row(
+                controls=[
+                    ft.ProgressRing(width=20, height=20, stroke_width=3),
+                    ft.Text("AIが考え中...", size=14)
+                ],
+                alignment=ft.MainAxisAlignment.CENTER
+            ),
+            bgcolor="white",
+            border=ft.border.all(2, "black"),
+            margin=ft.margin.all(5),
+            border_radius=ft.border_radius.all(10),
+            alignment=ft.alignment.center,
+            expand=1,
+            visible=False,
+        )
+
         self.othello_count = ft.Container(
             content=ft.Text("白: 枚 黒: 枚", size=20),
             bgcolor="white",
@@ -326,6 +158,7 @@ class GUI:
             controls=[
                 self.change_switch,
                 self.info_text,
+                self.thinking_indicator,
                 self.othello_count,
                 self.control_buttons
             ],
@@ -357,7 +190,7 @@ class GUI:
     #スタートボタンの処理
     def start_game(self, e):
         if not self.isgame:
-            self.game = OthelloGame()
+            self.game = OthelloGame(book=self.book)
             is_ai_mode = self.change_switch.content.controls[1].value
             first_player = random.choice([-1, 1])
             self.game.initialize_game(first_player)
@@ -375,56 +208,34 @@ class GUI:
     #リセットボタンの処理
     def reset_game(self, e):
         if self.isgame:
-            self.del_valid_moves()
+            with self.ui_lock:
+                self.cancel_ai_turn()
             # 全マスをクリア
-            for r in range(self.grid_size):
-                for c in range(self.grid_size):
-                    self.grid[r][c].content = None
-                    self.grid[r][c].border = ft.border.all(2, "black")
-            self.info_text.content = ft.Text("ゲームをリセットしました。スタートボタンを押してください。", size=20)
-            self.othello_count.content = ft.Text("黒: 2\n白: 2", size=20)
+            self.view.clear()
+            self.info_text.content.value = "ゲームをリセットしました。スタートボタンを押してください。"
+            self.othello_count.content.value = "黒: 2\n白: 2"
             self.isgame = False
+            self.thinking_indicator.visible = False
             self.page.update()
 
     #盤面の初期化
     def initialize_game(self):
-        for row in range(self.grid_size):
-            for col in range(self.grid_size):
-                val = self.game.board_state[row+1][col+1]
-                if val == 1:
-                    self.grid[row][col].content = ft.CircleAvatar(
-                        radius=self.grid_px // 2, bgcolor="white"
-                    )
-                    self.grid[row][col].on_click = None
-                elif val == -1:
-                    self.grid[row][col].content = ft.CircleAvatar(
-                        radius=self.grid_px // 2, bgcolor="black"
-                    )
-                    self.grid[row][col].on_click = None
-                else:
-                    self.grid[row][col].content = None
-                    self.grid[row][col].on_click = lambda e, r=row, c=col: self.handle_click(r, c)
-
         msg = "白が先行です" if self.game.current_player == 1 else "黒が先行です"
-        self.info_text.content = ft.Text(msg, size=20)
-
-        self.othello_count.content = ft.Text(
-            f"黒:{self.game.black_count}\n白:{self.game.white_count}",
-            size=20
-        )
-
-        self.draw_valid_moves()
+        self.info_text.content.value = msg
+        self.render()
         self.page.update()
 
-    #石を置ける場所を描画
-    def draw_valid_moves(self):
-        for (r, c) in self.game.valid_moves:
-            self.grid[r-1][c-1].border = ft.border.all(2, "yellow")
+    #盤面・石の数・置ける場所を描画(page.updateは呼び出し側でまとめて行う)
+    def render(self):
+        self.view.render(self.game.board_state.get, self.game.valid_moves)
+        self.othello_count.content.value = f"黒:{self.game.black_count}\n白:{self.game.white_count}"
 
-    #描画を削除
-    def del_valid_moves(self):
-        for (r, c) in self.game.valid_moves:
-            self.grid[r-1][c-1].border = ft.border.all(2, "black")
+    #手番または結果を表示
+    def show_turn(self, game):
+        if game.current_player == 0:
+            self.info_text.content.value = f"両者に置ける場所がありません。\n{game.judge_winner()}"
+        else:
+            self.info_text.content.value = "白のターンです" if game.current_player == 1 else "黒のターンです"
 
     #マスのクリック処理
     def handle_click(self, row, col):
@@ -445,78 +256,137 @@ class GUI:
             print("そこには置けません！")
             return
 
-        self.del_valid_moves()
-
         self.game.update_state(br, bc)
-        self.draw_circle(row, col, cp)
-        for (rr, cc) in self.game.flippable_pos:
-            self.draw_circle(rr-1, cc-1, cp)
-
-        self.othello_count.content = ft.Text(
-            f"黒:{self.game.black_count}\n白:{self.game.white_count}",
-            size=20
-        )
+        self.render()
+        self.show_turn(self.game)
 
-        if self.game.current_player == 0:
-            self.info_text.content = ft.Text(
-                f"両者に置ける場所がありません。\n{self.game.judge_winner()}",
-                size=20
-            )
-            self.page.update()
+        if is_ai_mode and self.game.current_player == self.game.ai_player:
+            self.start_ai_turn()
             return
 
-        msg = "白のターンです" if self.game.current_player == 1 else "黒のターンです"
-        self.info_text.content = ft.Text(msg, size=20)
-
-        if is_ai_mode and self.game.current_player == self.game.ai_player and self.game.current_player != 0:
-            self.draw_valid_moves()
-            self.page.update()
+        self.page.update()
 
-            time.sleep(1)
+    #AIの手番をバックグラウンドで始める
+    def start_ai_turn(self):
+        self.ai_token += 1
+        self.ai_cancel = threading.Event()
+        self.thinking_indicator.content.controls[1].value = "AIが考え中..."
+        self.thinking_indicator.visible = True
+        self.page.update()
+        self.page.run_thread(self.run_ai_turn, self.game, self.ai_token, self.ai_cancel)
+
+    #考え中のAIを中止する
+    def cancel_ai_turn(self):
+        self.ai_token += 1
+        self.ai_cancel.set()
+        if self.game is not None:
+            self.game.stop_search()
+
+    #AIの手番(バックグラウンドのスレッドで実行)
+    #ユーザーが置けずにAIが続けて打つ場合もここで続けて考える
+    def run_ai_turn(self, game, token, cancel):
+        while game.current_player == game.ai_player:
+            started = time.perf_counter()
+            try:
+                ai_pos = self.think(game, token, cancel)
+            except SearchCancelled:
+                return
+            except Exception:
+                #ワーカーが落ちた・結果を受け取れないなどで打てないときは、考え中の表示を消して知らせる
+                logger.exception("AI search failed")
+                self.show_ai_error(token)
+                return
 
-            self.del_valid_moves()
-            ai_pos = self.game.ai_move(depth=2)
-            if ai_pos is not None:
-                old_cp = self.game.current_player 
-                self.game.update_state(ai_pos[0], ai_pos[1])
-                self.draw_circle(ai_pos[0]-1, ai_pos[1]-1, old_cp)
-                for (rr, cc) in self.game.flippable_pos:
-                    self.draw_circle(rr-1, cc-1, old_cp)
+            #すぐに打つと分かりにくいので最低限の時間は待つ(リセットされたらすぐ抜ける)
+            if cancel.wait(max(0.0, self.ai_min_delay - (time.perf_counter() - started))):
+                return
 
-                self.othello_count.content = ft.Text(
-                    f"黒:{self.game.black_count}\n白:{self.game.white_count}",
-                    size=20
-                )
-                if self.game.current_player == 0:
-                    self.info_text.content = ft.Text(
-                        f"両者に置ける場所がありません。\n{self.game.judge_winner()}",
-                        size=20
-                    )
-                else:
-                    msg2 = "白のターンです" if self.game.current_player == 1 else "黒のターンです"
-                    self.info_text.content = ft.Text(msg2, size=20)
+            with self.ui_lock:
+                if token != self.ai_token:
+                    return
+                game.update_state(ai_pos[0], ai_pos[1])
+                self.render()
+                self.show_turn(game)
+                self.thinking_indicator.visible = game.current_player == game.ai_player
+                self.page.update()
+
+    #AIの手を考える(サーバーモードでは共有のエンジンに依頼して結果を待つ)
+    def think(self, game, token, cancel):
+        if self.engine is None:
+            game.on_progress = lambda g: self.show_progress(g, token)
+            try:
+                return game.ai_move(depth=self.ai_depth)
+            finally:
+                game.on_progress = None
+
+        board = game.board_state
+        try:
+            future = self.engine.submit(self.session_id, board.white, board.black,
+                                        game.current_player, depth=self.ai_depth)
+            while not cancel.wait(0.05):
+                if future.done():
+                    return future.result()
+        except (EngineBusy, EngineTimeout):
+            #混み合っているときはこのページで探索せず(置換表も終盤ソルバーも使わず)、マスの優先度で打つ
+            return game.quick_move()
+        future.cancel()
+        raise SearchCancelled
+
+    #AIが打てなくなったことを表示する(リセットすればやり直せる)
+    def show_ai_error(self, token):
+        with self.ui_lock:
+            if token != self.ai_token:
+                return
+            self.thinking_indicator.visible = False
+            self.info_text.content.value = "AIでエラーが起きました。\nリセットしてやり直してください。"
+            self.page.update()
 
-        self.draw_valid_moves()
+    #ページが閉じられたら考え中のAIと待っている依頼を取り消す
+    def close(self):
+        with self.ui_lock:
+            self.cancel_ai_turn()
+        if self.engine is not None:
+            self.engine.cancel_session(self.session_id)
+
+    #探索中のノード数を表示する(0.2秒に1回まで)
+    def show_progress(self, game, token):
+        now = time.perf_counter()
+        if now - self.last_progress < 0.2 or token != self.ai_token:
+            return
+        self.last_progress = now
+        self.thinking_indicator.content.controls[1].value = f"AIが考え中... {game.nodes}ノード"
         self.page.update()
 
-    #石を描画
-    def draw_circle(self, row, col, player):
-        if player == 1:
-            self.grid[row][col].content = ft.CircleAvatar(
-                radius=self.grid_px // 2, bgcolor="white"
-            )
-        else:
-            self.grid[row][col].content = ft.CircleAvatar(
-                radius=self.grid_px // 2, bgcolor="black"
-            )
-        self.grid[row][col].on_click = None
 
+#サーバーモードで全セッションが共有する探索エンジン(Noneなら各ページで読む)
+engine_pool = None
+#定跡(サーバーモードでなければ全ページで共有する)
+opening_book = None
 
 def main(page: ft.Page):
-    gui = GUI(page)
+    gui = GUI(page, engine=engine_pool, book=opening_book)
     page.title = "オセロ"
     page.window.width = gui.page_width
     page.window.height = gui.page_height
+    page.on_disconnect = lambda e: gui.close()
     page.add(gui.gui_container)
 
-ft.app(target=main)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ミニマックス法のAIと対戦できるオセロ")
+    parser.add_argument("--server", action="store_true", help="ブラウザ向けのサーバーとして起動し、AIの探索を全セッションで共有する")
+    parser.add_argument("--port", type=int, default=8550)
+    parser.add_argument("--workers", type=int, default=2, help="サーバーモードの探索プロセス数")
+    parser.add_argument("--max-pending", type=int, default=64, help="サーバーモードで待たせておける依頼の数")
+    parser.add_argument("--book", help="定跡ファイル(opening_book.pyで作る)")
+    args = parser.parse_args()
+
+    if args.server:
+        engine_pool = EnginePool(workers=args.workers, max_pending=args.max_pending, book=args.book)
+        try:
+            ft.app(target=main, view=ft.AppView.WEB_BROWSER, port=args.port)
+        finally:
+            engine_pool.close()
+    else:
+        if args.book:
+            opening_book = OpeningBook(args.book)
+        ft.app(target=main)
@@ -0,0 +1,412 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+from bitboard import BitBoard, get_flips, get_moves, iter_squares
+from minimax_engine import OthelloGame
+from search_stats import SearchStats
+
+#合法手生成の検証(perft)と速さの計測をまとめて行い、結果をJSONに書き出す(GUIなしで動く)
+#  python benchmark.py --output bench.json
+#  python benchmark.py --output new.json --compare bench.json   # 前の結果と比べる
+#perftの数が期待値と違うか、評価関数が白黒を入れ替えて符号が反転しなければ終了コード1で終わる
+#  perft … 盤面からdepth手先までの局面(葉)の数 パスも1手と数え、終局した局面はそこで1と数える
+
+#盤面の文字列は 行*8 + 列 の順に64文字(X:黒, O:白, -:空き)と手番(X / O)
+#期待値は1手先から順に並べた葉の数
+START_PERFT = [4, 12, 56, 244, 1396, 8200, 55092, 390216]
+TEST_POSITIONS = [
+    ("----------X--------XO-----XOO-----OXO----O-X----O--XO-----------", "X", [8, 63, 523, 4666, 42214]),
+    ("-------X------X--XXXXX----OXXX--OOOOXO----OOOX-----XX------X----", "X", [10, 121, 1167, 16004, 164708]),
+    ("--O-O-----OOOO--XXO-OOOO-OXXOO--OXXXOO--X-X-OX-----XXOX-------OX", "X", [11, 144, 1602, 20799, 239422]),
+    ("--OOO-O-OOOOOOOX-OXXOXOXXXXOXOOXOOOOOOO--OXXX---O-OOOX-----OOOOO", "X", [12, 69, 724, 3383, 30693]),
+    ("OXXX--O-XOXXXOOX--OXOOOXOOOOXXOXOOOXXXXXOOOOOOXX-OOOOOOX--O-X-XO", "X", [10, 53, 372, 1747, 8604]),
+    #手番側が打てずにパスから始まる局面
+    ("XXXXXXXXXXXXXXXOXXXOOXOOXXXOXO-OXOOXOOOOXOOOOXO-X-OOOOXX----OXXX", "O", [1, 5, 11, 44, 85]),
+]
+
+
+#盤面の文字列から (黒, 白) のビットボードを作る
+def parse_position(text):
+    black = sum(1 << i for i, c in enumerate(text) if c == "X")
+    white = sum(1 << i for i, c in enumerate(text) if c == "O")
+    return black, white
+
+
+#ビットボードの関数だけで数える
+def perft_bitboard(p, o, depth, passed=False):
+    if depth == 0:
+        return 1
+    moves = get_moves(p, o)
+    if not moves:
+        return 1 if passed else perft_bitboard(o, p, depth - 1, True)
+    n = 0
+    for sq in iter_squares(moves):
+        flips = get_flips(p, o, sq)
+        n += perft_bitboard(o ^ flips, p | flips | (1 << sq), depth - 1)
+    return n
+
+
+#minimax_engine(Reversi_MiniMax.py)のfind_valid_moves + simulate_move / undo_move で数える(白:1, 黒:-1)
+def perft_engine(game, board, player, depth, passed=False):
+    if depth == 0:
+        return 1
+    moves = game.find_valid_moves(board, player)
+    if not moves:
+        return 1 if passed else perft_engine(game, board, -player, depth - 1, True)
+    n = 0
+    for row, col in moves:
+        flips = game.simulate_move(board, row, col, player)
+        n += perft_engine(game, board, -player, depth - 1)
+        game.undo_move(board, row, col, player, flips)
+    return n
+
+
+#othello_game(DQN用)のget_valid_moves + make_move で数える(黒:1, 白:-1)
+def perft_dqn_game(game, player, depth, passed=False):
+    if depth == 0:
+        return 1
+    moves = game.get_valid_moves(player)
+    if not moves:
+        return 1 if passed else perft_dqn_game(game, -player, depth - 1, True)
+    bits = game.bits
+    n = 0
+    for move in moves:
+        game.make_move(move, player)
+        n += perft_dqn_game(game, -player, depth - 1)
+        game.bits = bits
+    return n
+
+
+#Reversi.py(GUI)のvalid_moves + update_state で数える(白:1, 黒:-1)
+#GUIと同じく手番の切り替え・パス・終局の判定はupdate_stateに任せる
+#相手がパスしたとき(打った側の手番のまま)はパスも1手と数えて2手進める
+def perft_gui_game(game, depth):
+    if depth == 0 or game.current_player == 0:
+        return 1
+    player = game.current_player
+    n = 0
+    for row, col in game.valid_moves:
+        board, moves = game.board_state.copy(), game.valid_moves
+        game.update_state(row, col)
+        if game.current_player == 0:
+            n += 1
+        elif game.current_player == player:
+            n += perft_gui_game(game, max(depth - 2, 0))
+        else:
+            n += perft_gui_game(game, depth - 1)
+        game.board_state, game.current_player, game.valid_moves = board, player, moves
+    return n
+
+
+#実装の名前 → (黒, 白, 黒の手番か) を受け取って perft(depth) を返す関数 を作る関数
+def _bitboard_counter():
+    def count(black, white, black_to_move, depth):
+        p, o = (black, white) if black_to_move else (white, black)
+        return perft_bitboard(p, o, depth)
+    return count
+
+
+def _engine_counter():
+    game = OthelloGame()
+
+    def count(black, white, black_to_move, depth):
+        return perft_engine(game, BitBoard(white, black), -1 if black_to_move else 1, depth)
+    return count
+
+
+def _dqn_game_counter():
+    from othello_game import OthelloGame as DQNGame
+    game = DQNGame()
+
+    def count(black, white, black_to_move, depth):
+        game.bits = BitBoard(white, black)
+        return perft_dqn_game(game, 1 if black_to_move else -1, depth)
+    return count
+
+
+def _gui_game_counter():
+    from Reversi import OthelloGame as GUIGame
+    game = GUIGame()
+
+    #update_stateは打った後のパスしか扱わないので、手番側が打てずに始まる局面のパスはここで進める
+    def count(black, white, black_to_move, depth):
+        game.board_state = BitBoard(white, black)
+        game.current_player = -1 if black_to_move else 1
+        game.valid_moves = game.find_valid_moves(game.board_state, game.current_player)
+        if not game.valid_moves:
+            game.current_player = -game.current_player
+            game.valid_moves = game.find_valid_moves(game.board_state, game.current_player)
+            if not game.valid_moves:
+                return 1
+            depth -= 1
+        return perft_gui_game(game, depth)
+    return count
+
+
+IMPLEMENTATIONS = {
+    "bitboard": _bitboard_counter,
+    "minimax_engine": _engine_counter,
+    "othello_game": _dqn_game_counter,
+    "Reversi": _gui_game_counter,
+}
+
+
+#1つの局面を1手先からdepth手先まで数えて期待値と比べ、いちばん深いものの速さを測る
+def _perft_case(count, black, white, black_to_move, depth, expected):
+    counts = [count(black, white, black_to_move, d) for d in range(1, depth)]
+    start = time.perf_counter()
+    counts.append(count(black, white, black_to_move, depth))
+    seconds = time.perf_counter() - start
+    return {
+        "depth": depth,
+        "counts": counts,
+        "ok": counts == expected[:depth],
+        "seconds": round(seconds, 6),
+        "nodes_per_sec": round(counts[-1] / seconds) if seconds > 0 else None,
+    }
+
+
+#各実装のperftを数える(読み込めない実装は理由を書いてとばす)
+#開始局面はdepth手先、テスト局面はdepth-1手先まで(期待値がある深さまで)
+def run_perft(depth=5, names=None):
+    results = {}
+    for name in names or IMPLEMENTATIONS:
+        try:
+            count = IMPLEMENTATIONS[name]()
+        except ImportError as e:
+            results[name] = {"skipped": str(e)}
+            continue
+        initial = BitBoard.initial()
+        cases = [_perft_case(count, initial.black, initial.white, True, min(depth, len(START_PERFT)), START_PERFT)]
+        for text, side, expected in TEST_POSITIONS:
+            black, white = parse_position(text)
+            case = _perft_case(count, black, white, side == "X", max(1, min(depth - 1, len(expected))), expected)
+            case["position"] = text + " " + side
+            cases.append(case)
+        leaves = sum(c["counts"][-1] for c in cases)
+        seconds = sum(c["seconds"] for c in cases)
+        results[name] = {
+            "ok": all(c["ok"] for c in cases),
+            "start": cases[0],
+            "positions": cases[1:],
+            "nodes_per_sec": round(leaves / seconds) if seconds > 0 else None,
+        }
+    return results
+
+
+#ai_moveの1手あたりの時間(ミリ秒)の分布を深さごとに測る
+#最初のopening手をランダムに打った局面から、その深さのAI同士で終局まで打つ
+def run_ai_latency(depths=(1, 2, 3), games=2, opening=4, seed=0):
+    rng = random.Random(seed)
+    results = {}
+    for depth in depths:
+        times = []
+        totals = {"nodes": 0, "leaves": 0, "cutoffs": 0, "tt_hits": 0}
+        stats = SearchStats()
+        for _ in range(games):
+            game = OthelloGame()
+            game.initialize_game(-1)
+            for _ in range(opening):
+                if game.current_player == 0:
+                    break
+                game.update_state(*rng.choice(game.valid_moves))
+            while game.current_player != 0:
+                start = time.perf_counter()
+                move = game.ai_move(depth=depth, stats=stats)
+                times.append((time.perf_counter() - start) * 1000)
+                for key in totals:
+                    totals[key] += getattr(stats, key)
+                game.update_state(*move)
+            game.close()
+        results[str(depth)] = _summarize(times)
+        results[str(depth)].update(totals)
+    return results
+
+
+def _summarize(times_ms):
+    times_ms = np.asarray(times_ms)
+    return {
+        "moves": int(len(times_ms)),
+        "mean_ms": round(float(times_ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(times_ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(times_ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(times_ms, 99)), 3),
+        "max_ms": round(float(times_ms.max()), 3),
+    }
+
+
+#ランダムに打った対局に現れる局面で、評価関数の白黒の対称性と1局面あたりの時間を調べる
+#evaluate(p, o) == -evaluate(o, p) でなければ探索が片方の色に偏り、手番側を白とみなす定跡も探索と食い違う
+def run_eval(games=20, seed=0, seconds=1.0):
+    from pattern_eval import PatternEvaluator
+    evaluator = PatternEvaluator()
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(games):
+        p, o = BitBoard.initial().black, BitBoard.initial().white
+        while True:
+            moves = get_moves(p, o)
+            if not moves:
+                p, o = o, p
+                if not get_moves(p, o):
+                    break
+                continue
+            positions.append((p, o))
+            sq = rng.choice(list(iter_squares(moves)))
+            flips = get_flips(p, o, sq)
+            p, o = o ^ flips, p | flips | (1 << sq)
+    asymmetric = sum(evaluator.evaluate(p, o) != -evaluator.evaluate(o, p) for p, o in positions)
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for p, o in positions:
+            evaluator.evaluate(p, o)
+        calls += len(positions)
+    return {
+        "ok": asymmetric == 0,
+        "positions": len(positions),
+        "asymmetric": asymmetric,
+        "us_per_leaf": round((time.perf_counter() - start) / calls * 1e6, 3),
+    }
+
+
+#自己対戦用の環境(OthelloVecEnv)で1秒あたりに進められる手の数
+def run_vector_env(num_envs=256, seconds=1.0, seed=0):
+    from othello_game import OthelloVecEnv
+    env = OthelloVecEnv(num_envs, seed=seed)
+    rng = np.random.default_rng(seed)
+    moves = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        env.step(rng.integers(0, 64, num_envs))
+        moves += num_envs
+    return {"num_envs": num_envs, "moves_per_sec": round(moves / (time.perf_counter() - start))}
+
+
+#DQNAgentのact / act_batch / replayの速さ(TensorFlowがなければとばす)
+def run_dqn(batch_size=64, num_envs=64, seconds=1.0):
+    try:
+        from dqn_agent import DQNAgent, load_tensorflow
+        load_tensorflow()
+    except ImportError as e:
+        return {"skipped": str(e)}
+    from othello_game import OthelloVecEnv
+
+    agent = DQNAgent((8, 8), 64, memory_size=10000)
+    agent.epsilon = 0.0
+    env = OthelloVecEnv(num_envs, seed=0)
+    while len(agent.memory) < 10 * batch_size:
+        states, masks = env.boards, env.legal_mask()
+        actions, next_boards, _, done, winner = env.step(agent.act_batch(states, masks))
+        agent.memory.add_batch(states, actions, np.where(done, winner, 0), next_boards, done)
+
+    def rate(func, n=1):
+        func()  # 最初の呼び出しはグラフの作成を含むので数えない
+        calls = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            func()
+            calls += 1
+        return round(calls * n / (time.perf_counter() - start), 1)
+
+    state, mask = env.boards[0], env.legal_mask()[0]
+    valid = list(np.flatnonzero(mask))
+    return {
+        "act_per_sec": rate(lambda: agent.act(state, valid)),
+        "act_batch_states_per_sec": rate(lambda: agent.act_batch(env.boards, env.legal_mask()), num_envs),
+        "replay_per_sec": rate(lambda: agent.replay(batch_size)),
+        "batch_size": batch_size,
+        "num_envs": num_envs,
+    }
+
+
+#計測した環境(比べるときに同じ条件かを確かめるため)
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+    }
+
+
+#前の結果と比べて、速さの比(新/旧)を表示する行を返す
+def compare(old, new):
+    lines = []
+
+    def ratio(label, a, b, higher_is_better=True):
+        if a and b:
+            r = b / a if higher_is_better else a / b
+            lines.append(f"{label}: {a:,} -> {b:,} ({r:.2f}x{'' if r >= 0.9 else '  遅くなった'})")
+
+    for name, result in new.get("perft", {}).items():
+        ratio(f"perft {name} nodes/s", old.get("perft", {}).get(name, {}).get("nodes_per_sec"), result.get("nodes_per_sec"))
+    for depth, result in new.get("ai_move", {}).items():
+        ratio(f"ai_move depth {depth} p50 ms", old.get("ai_move", {}).get(depth, {}).get("p50_ms"), result.get("p50_ms"), False)
+    ratio("evaluate us/leaf", old.get("eval", {}).get("us_per_leaf"), new.get("eval", {}).get("us_per_leaf"), False)
+    ratio("vector env moves/s", old.get("vector_env", {}).get("moves_per_sec"), new.get("vector_env", {}).get("moves_per_sec"))
+    for key in ("act_per_sec", "act_batch_states_per_sec", "replay_per_sec"):
+        ratio(f"dqn {key}", old.get("dqn", {}).get(key), new.get("dqn", {}).get(key))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="perftによる合法手生成の検証とベンチマーク")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル(省略すると標準出力)")
+    parser.add_argument("--compare", help="比べる前の結果のJSONファイル")
+    parser.add_argument("--perft-depth", type=int, default=5, help="開始局面のperftの深さ(テスト局面は1つ浅くする)")
+    parser.add_argument("--impl", action="append", choices=list(IMPLEMENTATIONS), help="perftを数える実装(複数指定可、省略で全部)")
+    parser.add_argument("--depths", default="1,2,3", help="ai_moveを測る深さ(カンマ区切り)")
+    parser.add_argument("--games", type=int, default=2, help="ai_moveを測る対局数")
+    parser.add_argument("--seconds", type=float, default=1.0, help="速さの計測1つあたりの時間")
+    parser.add_argument("--skip", action="append", default=[], choices=["perft", "eval", "ai_move", "vector_env", "dqn"])
+    args = parser.parse_args(argv)
+
+    results = {"environment": environment()}
+    if "perft" not in args.skip:
+        results["perft"] = run_perft(args.perft_depth, args.impl)
+    if "eval" not in args.skip:
+        results["eval"] = run_eval(seconds=args.seconds)
+    if "ai_move" not in args.skip:
+        results["ai_move"] = run_ai_latency([int(d) for d in args.depths.split(",")], args.games)
+    if "vector_env" not in args.skip:
+        results["vector_env"] = run_vector_env(seconds=args.seconds)
+    if "dqn" not in args.skip:
+        results["dqn"] = run_dqn(seconds=args.seconds)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        for line in compare(old, results):
+            print(line, file=sys.stderr)
+
+    failed = [name for name, r in results.get("perft", {}).items() if r.get("ok") is False]
+    if failed:
+        print(f"perft mismatch: {', '.join(failed)}", file=sys.stderr)
+    if results.get("eval", {}).get("ok") is False:
+        print(f"evaluate is not color-symmetric in {results['eval']['asymmetric']} positions", file=sys.stderr)
+    return 1 if failed or results.get("eval", {}).get("ok") is False else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+import numpy as np
+
+#ビットボードによるオセロの盤面表現とルール
+#64ビット整数2つ(白・黒)で盤面を持ち、シフトとマスクで合法手と反転石を計算する
+#マス番号は sq = (row-1)*8 + (col-1) で、GUIが使う1始まりの座標(row, col)と対応する
+#(0始まりの8x8の配列なら sq = x*8 + y)
+#Reversi.py・Reversi_MiniMax.py・othello_game.pyのOthelloGameはどれもこのモジュールでルールを計算する
+#たくさんの盤面をまとめて計算するときはuint64のNumPy配列を受け取る *_batch の関数を使う
+
+FULL_MASK = 0xFFFFFFFFFFFFFFFF
+NOT_A_FILE = 0xFEFEFEFEFEFEFEFE  # 左端の列を除く
+NOT_H_FILE = 0x7F7F7F7F7F7F7F7F  # 右端の列を除く
+
+#(シフト量, シフト後にかけるマスク) 正は左シフト、負は右シフト
+DIRECTIONS = (
+    (-8, FULL_MASK),   # 上
+    (8, FULL_MASK),    # 下
+    (-1, NOT_H_FILE),  # 左
+    (1, NOT_A_FILE),   # 右
+    (-9, NOT_H_FILE),  # 左上
+    (-7, NOT_A_FILE),  # 右上
+    (7, NOT_H_FILE),   # 左下
+    (9, NOT_A_FILE),   # 右下
+)
+
+
+#各マスの周囲8マスのマスク
+NEIGHBOURS = tuple(
+    sum(
+        1 << ((r + dr) * 8 + (c + dc))
+        for dr in (-1, 0, 1)
+        for dc in (-1, 0, 1)
+        if (dr or dc) and 0 <= r + dr < 8 and 0 <= c + dc < 8
+    )
+    for r in range(8)
+    for c in range(8)
+)
+
+
+#NumPy配列用のシフト量(uint64同士でシフトしないと古いNumPyではfloatに変換されてしまう)
+_U = {n: np.uint64(n) for n in (1, 2, 7, 8, 9, 14, 16, 18)}
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+_BIT_VALUES = np.uint64(1) << _BIT_SHIFTS
+
+
+#1始まりの座標をマス番号に変換
+def square_index(row, col):
+    return (row - 1) * 8 + (col - 1)
+
+
+#マス番号を1始まりの座標に変換
+def square_pos(sq):
+    return sq // 8 + 1, sq % 8 + 1
+
+
+#立っているビットの数を数える(Python 3.10以降はint.bit_countをそのまま使う)
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+else:
+    def popcount(x):
+        return bin(x).count("1")
+
+
+#立っているビットのマス番号を小さい順に返す
+def iter_squares(x):
+    while x:
+        lsb = x & -x
+        yield lsb.bit_length() - 1
+        x ^= lsb
+
+
+#石に隣接する空きマスのマスク(合法手の候補)
+def get_frontier(player_bb, opponent_bb):
+    occupied = player_bb | opponent_bb
+    frontier = 0
+    for sq in iter_squares(occupied):
+        frontier |= NEIGHBOURS[sq]
+    return frontier & ~occupied & FULL_MASK
+
+
+#合法手をビットマスクで返す
+#candidatesを渡すとその中の空きマスだけを調べる
+#相手の石を端の列・行を除いたマスクにしておけば、左右の2方向を同じマスクで同時に伸ばせる
+def get_moves(player_bb, opponent_bb, candidates=None):
+    if candidates is None:
+        empty = ~(player_bb | opponent_bb) & FULL_MASK
+    else:
+        empty = candidates & ~(player_bb | opponent_bb)
+    p = player_bb
+
+    #左右
+    m = opponent_bb & 0x7E7E7E7E7E7E7E7E
+    fl = m & (p << 1)
+    fr = m & (p >> 1)
+    fl |= m & (fl << 1)
+    fr |= m & (fr >> 1)
+    ml = m & (m << 1)
+    mr = ml >> 1
+    fl |= ml & (fl << 2)
+    fr |= mr & (fr >> 2)
+    fl |= ml & (fl << 2)
+    fr |= mr & (fr >> 2)
+    moves = (fl << 1) | (fr >> 1)
+
+    #上下
+    m = opponent_bb & 0x00FFFFFFFFFFFF00
+    fl = m & (p << 8)
+    fr = m & (p >> 8)
+    fl |= m & (fl << 8)
+    fr |= m & (fr >> 8)
+    ml = m & (m << 8)
+    mr = ml >> 8
+    fl |= ml & (fl << 16)
+    fr |= mr & (fr >> 16)
+    fl |= ml & (fl << 16)
+    fr |= mr & (fr >> 16)
+    moves |= (fl << 8) | (fr >> 8)
+
+    #斜め
+    m = opponent_bb & 0x007E7E7E7E7E7E00
+    fl = m & (p << 7)
+    fr = m & (p >> 7)
+    fl |= m & (fl << 7)
+    fr |= m & (fr >> 7)
+    ml = m & (m << 7)
+    mr = ml >> 7
+    fl |= ml & (fl << 14)
+    fr |= mr & (fr >> 14)
+    fl |= ml & (fl << 14)
+    fr |= mr & (fr >> 14)
+    moves |= (fl << 7) | (fr >> 7)
+
+    fl = m & (p << 9)
+    fr = m & (p >> 9)
+    fl |= m & (fl << 9)
+    fr |= m & (fr >> 9)
+    ml = m & (m << 9)
+    mr = ml >> 9
+    fl |= ml & (fl << 18)
+    fr |= mr & (fr >> 18)
+    fl |= ml & (fl << 18)
+    fr |= mr & (fr >> 18)
+    moves |= (fl << 9) | (fr >> 9)
+
+    return moves & empty
+
+
+#sqに置いたときにひっくり返る石をビットマスクで返す
+def get_flips(player_bb, opponent_bb, sq):
+    x = 1 << sq
+    flips = 0
+    for shift, mask in DIRECTIONS:
+        f = 0
+        if shift > 0:
+            t = (x << shift) & mask
+            while t & opponent_bb:
+                f |= t
+                t = (t << shift) & mask
+        else:
+            s = -shift
+            t = (x >> s) & mask
+            while t & opponent_bb:
+                f |= t
+                t = (t >> s) & mask
+        if t & player_bb:
+            flips |= f
+    return flips
+
+
+#get_movesと同じ計算をuint64の配列でまとめて行う(合法手のマスクの配列を返す)
+def get_moves_batch(player_bb, opponent_bb):
+    p = np.asarray(player_bb, dtype=np.uint64)
+    o = np.asarray(opponent_bb, dtype=np.uint64)
+    empty = ~(p | o)
+    moves = np.zeros_like(p)
+    for s1, s2, inner in ((_U[1], _U[2], 0x7E7E7E7E7E7E7E7E),
+                          (_U[8], _U[16], 0x00FFFFFFFFFFFF00),
+                          (_U[7], _U[14], 0x007E7E7E7E7E7E00),
+                          (_U[9], _U[18], 0x007E7E7E7E7E7E00)):
+        m = o & np.uint64(inner)
+        fl = m & (p << s1)
+        fr = m & (p >> s1)
+        fl |= m & (fl << s1)
+        fr |= m & (fr >> s1)
+        ml = m & (m << s1)
+        mr = ml >> s1
+        fl |= ml & (fl << s2)
+        fr |= mr & (fr >> s2)
+        fl |= ml & (fl << s2)
+        fr |= mr & (fr >> s2)
+        moves |= (fl << s1) | (fr >> s1)
+    return moves & empty
+
+
+#get_flipsと同じ計算をuint64の配列でまとめて行う(sqもマス番号の配列)
+def get_flips_batch(player_bb, opponent_bb, sq):
+    p = np.asarray(player_bb, dtype=np.uint64)
+    o = np.asarray(opponent_bb, dtype=np.uint64)
+    x = np.uint64(1) << np.asarray(sq, dtype=np.uint64)
+    flips = np.zeros_like(p)
+    for shift, mask in DIRECTIONS:
+        m = o & np.uint64(mask)
+        cap = p & np.uint64(mask)
+        if shift > 0:
+            s = _U[shift]
+            f = (x << s) & m
+            for _ in range(5):
+                f |= (f << s) & m
+            capped = ((f << s) & cap) != 0
+        else:
+            s = _U[-shift]
+            f = (x >> s) & m
+            for _ in range(5):
+                f |= (f >> s) & m
+            capped = ((f >> s) & cap) != 0
+        flips |= np.where(capped, f, np.uint64(0))
+    return flips
+
+
+#ビットボード(またはその配列)の立っているビットの数
+def popcount_batch(x):
+    x = np.asarray(x, dtype=np.uint64)
+    return ((x[..., None] >> _BIT_SHIFTS) & np.uint64(1)).sum(axis=-1).astype(np.int8)
+
+
+#8x8の配列(0始まり)でvalueの石があるマスをビットボードにする
+def array_to_bits(board, value):
+    return int(np.bitwise_or.reduce(np.where(np.asarray(board).reshape(64) == value, _BIT_VALUES, np.uint64(0))))
+
+
+#ビットボードを8x8の0/1配列にする(ビットボードの配列なら形が(..., 8, 8)になる)
+def bits_to_array(bb):
+    bb = np.asarray(bb, dtype=np.uint64)
+    return ((bb[..., None] >> _BIT_SHIFTS) & np.uint64(1)).astype(np.int8).reshape(bb.shape + (8, 8))
+
+
+#白(1)と黒(-1)の石をビットボードで保持する盤面
+class BitBoard:
+    __slots__ = ("white", "black")
+
+    def __init__(self, white=0, black=0):
+        self.white = white
+        self.black = black
+
+    #初期配置の盤面を作る
+    @classmethod
+    def initial(cls):
+        white = (1 << square_index(4, 4)) | (1 << square_index(5, 5))
+        black = (1 << square_index(4, 5)) | (1 << square_index(5, 4))
+        return cls(white, black)
+
+    def copy(self):
+        return BitBoard(self.white, self.black)
+
+    #playerの石と相手の石を返す
+    def split(self, player):
+        if player == 1:
+            return self.white, self.black
+        return self.black, self.white
+
+    #playerの石と相手の石をまとめて書き戻す
+    def set_split(self, player, player_bb, opponent_bb):
+        if player == 1:
+            self.white, self.black = player_bb, opponent_bb
+        else:
+            self.black, self.white = player_bb, opponent_bb
+
+    #1始まりの座標の石を返す(白:1, 黒:-1, 空き:0)
+    def get(self, row, col):
+        bit = 1 << square_index(row, col)
+        if self.white & bit:
+            return 1
+        if self.black & bit:
+            return -1
+        return 0
+
+    #8x8のint8配列(0始まり)から作る 石の値はwhite・blackで指定する(othello_game.pyは黒が1)
+    @classmethod
+    def from_array(cls, board, white=1, black=-1):
+        return cls(array_to_bits(board, white), array_to_bits(board, black))
+
+    #8x8のint8配列(0始まり)にする
+    def to_array(self, white=1, black=-1):
+        return bits_to_array(self.white) * np.int8(white) + bits_to_array(self.black) * np.int8(black)
+
+    #番兵"w"で囲んだ10x10の盤面(1始まり、Reversi.pyの元の形式)から作る
+    @classmethod
+    def from_padded(cls, board):
+        inner = np.asarray(board, dtype=object)[1:-1, 1:-1].astype(np.int8)
+        return cls.from_array(inner)
+
+    #番兵"w"で囲んだ10x10の盤面にする(表示・ログ用)
+    def to_padded(self):
+        board = np.full((10, 10), "w", dtype=object)
+        board[1:-1, 1:-1] = self.to_array()
+        return board
+
+    def empty_count(self):
+        return 64 - popcount(self.white | self.black)
+
+    def __eq__(self, other):
+        return isinstance(other, BitBoard) and self.white == other.white and self.black == other.black
+
+    def __hash__(self):
+        return hash((self.white, self.black))
+
+    def __repr__(self):
+        return f"BitBoard(white=0x{self.white:016x}, black=0x{self.black:016x})"
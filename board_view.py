@@ -0,0 +1,60 @@
+import flet as ft
+
+#オセロ盤の描画
+#前回描画した盤面を覚えておき、変わったマスのコントロールだけを書き換える
+#石(CircleAvatar)と枠線はマスごとに最初に1回だけ作って使い回す
+
+BORDER_NORMAL = ft.border.all(2, "black")
+BORDER_HINT = ft.border.all(2, "yellow")
+STONE_COLORS = {1: "white", -1: "black"}
+
+
+class BoardView:
+    def __init__(self, grid, radius):
+        #grid: 8x8のft.Container (on_clickは作成時に設定しておく)
+        self.grid = grid
+        self.size = len(grid)
+        self.stones = []
+        for row_controls in grid:
+            stones = []
+            for cell in row_controls:
+                stone = ft.CircleAvatar(radius=radius, bgcolor="black", visible=False)
+                cell.content = stone
+                cell.border = BORDER_NORMAL
+                stones.append(stone)
+            self.stones.append(stones)
+        #いま表示している石(1:白, -1:黒, 0:なし)と枠線を黄色にしているマス(1始まり)
+        self.shown = [[0] * self.size for _ in range(self.size)]
+        self.hints = set()
+
+    #盤面を描画する get_stone(row, col)は1始まりの座標の石を返す関数
+    #変わったマスだけを書き換え、書き換えたマスの数を返す(page.updateは呼び出し側でまとめて行う)
+    def render(self, get_stone, valid_moves=()):
+        changed = 0
+        for r in range(self.size):
+            shown = self.shown[r]
+            for c in range(self.size):
+                val = get_stone(r + 1, c + 1)
+                if val != shown[c]:
+                    stone = self.stones[r][c]
+                    if val == 0:
+                        stone.visible = False
+                    else:
+                        stone.bgcolor = STONE_COLORS[val]
+                        stone.visible = True
+                    shown[c] = val
+                    changed += 1
+
+        hints = set(valid_moves)
+        for (r, c) in self.hints - hints:
+            self.grid[r-1][c-1].border = BORDER_NORMAL
+            changed += 1
+        for (r, c) in hints - self.hints:
+            self.grid[r-1][c-1].border = BORDER_HINT
+            changed += 1
+        self.hints = hints
+        return changed
+
+    #石と枠線をすべて消す
+    def clear(self):
+        return self.render(lambda r, c: 0)
@@ -1,26 +1,44 @@
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import Model
-from tensorflow.keras.layers import Input, Dense, Lambda, Add, Subtract, Conv2D, Flatten
-from tensorflow.keras.optimizers import Adam
-from collections import deque
 import random
+from replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
+
+#TensorFlowは読み込みに時間がかかるので、モデルを作るときに初めて読み込む
+tf = None
+
+def load_tensorflow():
+    global tf
+    if tf is None:
+        import tensorflow
+        tf = tensorflow
+    return tf
 
 class DQNAgent:
-    def __init__(self, state_size, action_size):
+    #prioritized=Trueなら、TD誤差が大きい経験ほど多く取り出して学習する
+    #augment=Trueなら、盤面を回転・反転した経験でも学習する
+    def __init__(self, state_size, action_size, memory_size=2000, prioritized=False, augment=False):
         self.state_size = state_size  # 状態の次元数 (8x8ボードの2D表現)
         self.action_size = action_size  # 行動の次元数 (64マス)
-        self.memory = deque(maxlen=2000)  # 経験の保存メモリ
+        if prioritized:
+            self.memory = PrioritizedReplayBuffer(memory_size, state_size, augment=augment)  # 経験の保存メモリ
+        else:
+            self.memory = ReplayBuffer(memory_size, state_size, augment=augment)
         self.gamma = 0.99  # 割引率
         self.epsilon = 1.0  # 探索率（ランダム行動の確率）
         self.epsilon_decay = 0.999  # 探索率の減少速度
         self.epsilon_min = 0.1  # 探索率の下限
         self.learning_rate = 0.001  # 学習率
+        self.double_dqn = True  # 次の行動の選択と評価を別のネットワークで行う
         self.model = self._build_model()  # 主ネットワーク
+        self._greedy = None  # 合法手の中から最善手を選ぶ関数(最初に使うときに作る)
         self.target_model = self._build_model()  # ターゲットネットワーク
         self.update_target_model()
 
     def _build_model(self):
+        load_tensorflow()
+        from tensorflow.keras.models import Model
+        from tensorflow.keras.layers import Input, Dense, Lambda, Add, Subtract, Conv2D, Flatten
+        from tensorflow.keras.optimizers import Adam
+
         inputs = Input(shape=(self.state_size[0], self.state_size[1], 1))
         conv1 = Conv2D(64, kernel_size=(3, 3), activation='relu', padding='same')(inputs)
         conv2 = Conv2D(64, kernel_size=(3, 3), activation='relu', padding='same')(conv1)
@@ -38,35 +56,85 @@ class DQNAgent:
         self.target_model.set_weights(self.model.get_weights())
 
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.add(state, action, reward, next_state, done)
 
     def act(self, state, valid_actions):
         if np.random.rand() <= self.epsilon:
             return random.choice(valid_actions)  # ランダムに合法手を選択
-        q_values = self.model.predict(state)
-        best_action = max(valid_actions, key=lambda a: q_values[0][a])
-        return best_action
-
+        mask = np.zeros((1, self.action_size), dtype=bool)
+        mask[0, valid_actions] = True
+        return int(self.greedy_actions(state, mask)[0])
+
+    #複数の盤面の手をまとめて選ぶ(盤面ごとに確率epsilonで合法手からランダムに選ぶ)
+    #states: (N, 8, 8) または (N, 8, 8, 1)、masks: 合法手の(N, 64)のbool
+    def act_batch(self, states, masks):
+        masks = np.asarray(masks, dtype=bool)
+        actions = self.greedy_actions(states, masks)
+        explore = np.random.rand(len(masks)) <= self.epsilon
+        if explore.any():
+            r = np.random.rand(int(explore.sum()), self.action_size)
+            r[~masks[explore]] = -1.0
+            actions[explore] = r.argmax(axis=1)
+        return actions
+
+    #合法手の中でQ値が最大の手をまとめて返す(epsilonは使わない)
+    def greedy_actions(self, states, masks):
+        if self._greedy is None:
+            self._greedy = self._build_greedy()
+        states = np.asarray(states, dtype=np.float32).reshape(-1, self.state_size[0], self.state_size[1], 1)
+        return self._greedy(states, np.asarray(masks, dtype=bool)).numpy()
+
+    #predictを通さずにモデルを直接呼び、合法手以外を除いた最大値の選択までグラフの中で行う関数を作る
+    def _build_greedy(self):
+        model = self.model
+
+        @tf.function(input_signature=[
+            tf.TensorSpec([None, self.state_size[0], self.state_size[1], 1], tf.float32),
+            tf.TensorSpec([None, self.action_size], tf.bool),
+        ])
+        def greedy(states, masks):
+            q_values = model(states, training=False)
+            q_values = tf.where(masks, q_values, tf.fill(tf.shape(q_values), q_values.dtype.min))
+            return tf.argmax(q_values, axis=1, output_type=tf.int32)
+
+        return greedy
+
+    #ミニバッチをまとめて学習する(順伝播は主ネットワークとターゲットネットワークで1回ずつ、勾配の更新は1回)
     def replay(self, batch_size):
         if len(self.memory) < batch_size:
             return
 
-        minibatch = random.sample(self.memory, batch_size)
-        for state, action, reward, next_state, done in minibatch:
-            target = self.model.predict(state)
-            if done:
-                target[0][action] = reward
-            else:
-                next_q_values = self.target_model.predict(next_state)
-                target[0][action] = reward + self.gamma * np.amax(next_q_values[0])
-            self.model.fit(state, target, epochs=1, verbose=0)
+        states, actions, rewards, next_states, dones, index, weights = self.memory.sample(batch_size)
+        shape = (batch_size, self.state_size[0], self.state_size[1], 1)
+        states = states.reshape(shape).astype(np.float32)
+        next_states = next_states.reshape(shape).astype(np.float32)
+        actions = actions.astype(np.int64)
+
+        # 今の状態と次の状態を主ネットワークにまとめて通す
+        q_values = np.array(self.model.predict_on_batch(np.concatenate([states, next_states])))
+        targets, next_q_values = q_values[:batch_size], q_values[batch_size:]
+        next_target_q_values = np.array(self.target_model.predict_on_batch(next_states))
+
+        if self.double_dqn:
+            # Double DQN: 次の行動は主ネットワークで選び、その価値はターゲットネットワークで評価する
+            next_actions = next_q_values.argmax(axis=1)
+            next_values = next_target_q_values[np.arange(batch_size), next_actions]
+        else:
+            next_values = next_target_q_values.max(axis=1)
+        rows = np.arange(batch_size)
+        new_values = np.where(dones, rewards, rewards + self.gamma * next_values)
+        td_errors = new_values - targets[rows, actions]
+        targets[rows, actions] = new_values
+        self.model.train_on_batch(states, targets, sample_weight=weights)
+        self.memory.update_priorities(index, td_errors)
 
         # 探索率の更新
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
     def load(self, name):
-        self.model = tf.keras.models.load_model(name)
+        self.model = load_tensorflow().keras.models.load_model(name)
+        self._greedy = None
 
     def save(self, name):
         self.model.save(name)
@@ -77,7 +145,7 @@ if __name__ == "__main__":
     agent = DQNAgent(state_size, action_size)
 
     # 仮の状態と合法手
-    state = np.random.rand(1, state_size[0], state_size[1], 1)
+    state = np.random.randint(-1, 2, (1, state_size[0], state_size[1], 1))
     valid_actions = [i for i in range(action_size)]
 
     # 行動を選択
@@ -85,7 +153,7 @@ if __name__ == "__main__":
     print(f"選択された行動: {action}")
 
     # メモリに経験を保存
-    next_state = np.random.rand(1, state_size[0], state_size[1], 1)
+    next_state = np.random.randint(-1, 2, (1, state_size[0], state_size[1], 1))
     reward = 1
     done = False
     agent.remember(state, action, reward, next_state, done)
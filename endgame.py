@@ -0,0 +1,141 @@
+import time
+from bitboard import get_flips, get_moves, popcount
+
+#終盤の完全読み
+#残りの空きマスが少ない局面を最後まで読み切り、勝敗(WLD)または最終石差を求める
+#盤面は (手番側の石, 相手の石) のビットボードで受け取り、評価値は手番側から見た石差
+
+INF = 65
+
+#4つの象限(4x4)ごとのマスク 偶数理論で空きが奇数の象限を優先するのに使う
+QUADRANTS = (
+    0x000000000F0F0F0F,
+    0x00000000F0F0F0F0,
+    0x0F0F0F0F00000000,
+    0xF0F0F0F000000000,
+)
+
+#この空きマス数以下では次の手の着手可能数による並べ替えをせず、偶数理論だけで並べる
+SHALLOW_EMPTIES = 5
+
+
+#持ち時間を超えたときに読みを打ち切るための例外
+class SolveTimeout(Exception):
+    pass
+
+
+#終局時の石差
+def final_score(player_bb, opponent_bb):
+    return popcount(player_bb) - popcount(opponent_bb)
+
+
+#空きが奇数の象限のマスクを返す
+def odd_regions(empty):
+    mask = 0
+    for q in QUADRANTS:
+        if popcount(empty & q) & 1:
+            mask |= q
+    return mask
+
+
+#終盤ソルバー
+#time_limit_msを超えるとSolveTimeoutを投げるので、呼び出し側は通常の探索に戻せる
+class EndgameSolver:
+    def __init__(self):
+        self.nodes = 0
+        self.deadline = None
+        #Trueにすると読みを中止する(SolveTimeoutを投げる)
+        self.stop_requested = False
+
+    #最善手と石差を返す (手番側の石, 相手の石)
+    #exact=Falseなら勝ち・負け・引き分けだけを読む(評価値は 1, -1, 0)
+    def solve(self, player_bb, opponent_bb, exact=True, time_limit_ms=None):
+        self.nodes = 0
+        self.deadline = None if time_limit_ms is None else time.perf_counter() + time_limit_ms / 1000
+        alpha, beta = (-INF, INF) if exact else (-1, 1)
+        empties = 64 - popcount(player_bb | opponent_bb)
+
+        moves = get_moves(player_bb, opponent_bb)
+        if not moves:
+            return None, self._search(player_bb, opponent_bb, alpha, beta, empties)
+
+        best_sq = None
+        best = -INF
+        for sq, flips in self._ordered_moves(player_bb, opponent_bb, moves, empties):
+            bit = 1 << sq
+            v = -self._search(opponent_bb ^ flips, player_bb | flips | bit, -beta, -alpha, empties - 1)
+            if v > best:
+                best = v
+                best_sq = sq
+                if v > alpha:
+                    alpha = v
+                    if alpha >= beta:
+                        break
+        if not exact:
+            best = (best > 0) - (best < 0)
+        return best_sq, best
+
+    #手番側から見た勝敗だけを返す (勝ち:1, 負け:-1, 引き分け:0)
+    def solve_wld(self, player_bb, opponent_bb, time_limit_ms=None):
+        return self.solve(player_bb, opponent_bb, exact=False, time_limit_ms=time_limit_ms)[1]
+
+    #ネガマックス法によるアルファベータ探索
+    def _search(self, player_bb, opponent_bb, alpha, beta, empties):
+        self.nodes += 1
+        if not self.nodes & 0x3FF and (
+            self.stop_requested or (self.deadline is not None and time.perf_counter() >= self.deadline)
+        ):
+            raise SolveTimeout
+
+        if empties == 1:
+            return self._last_move(player_bb, opponent_bb)
+
+        moves = get_moves(player_bb, opponent_bb)
+        if not moves:
+            if not get_moves(opponent_bb, player_bb):
+                return final_score(player_bb, opponent_bb)
+            return -self._search(opponent_bb, player_bb, -beta, -alpha, empties)
+
+        best = -INF
+        for sq, flips in self._ordered_moves(player_bb, opponent_bb, moves, empties):
+            bit = 1 << sq
+            v = -self._search(opponent_bb ^ flips, player_bb | flips | bit, -beta, -alpha, empties - 1)
+            if v > best:
+                best = v
+                if v > alpha:
+                    alpha = v
+                    if alpha >= beta:
+                        break
+        return best
+
+    #空きマスが1つだけのとき、合法手生成をせずに直接最終石差を計算する
+    def _last_move(self, player_bb, opponent_bb):
+        empty = ~(player_bb | opponent_bb) & 0xFFFFFFFFFFFFFFFF
+        sq = empty.bit_length() - 1
+        flips = get_flips(player_bb, opponent_bb, sq)
+        if flips:
+            n = popcount(flips)
+            return final_score(player_bb, opponent_bb) + 2 * n + 1
+        flips = get_flips(opponent_bb, player_bb, sq)
+        if flips:
+            n = popcount(flips)
+            return final_score(player_bb, opponent_bb) - 2 * n - 1
+        return final_score(player_bb, opponent_bb)
+
+    #偶数理論と速さ優先(相手の着手可能数が少ない順)で手を並べて (マス, 反転石) を返す
+    def _ordered_moves(self, player_bb, opponent_bb, moves, empties):
+        odd = odd_regions(~(player_bb | opponent_bb) & 0xFFFFFFFFFFFFFFFF)
+        ordered = []
+        while moves:
+            bit = moves & -moves
+            moves ^= bit
+            sq = bit.bit_length() - 1
+            flips = get_flips(player_bb, opponent_bb, sq)
+            if empties <= SHALLOW_EMPTIES:
+                score = 0 if bit & odd else 1
+            else:
+                mobility = popcount(get_moves(opponent_bb ^ flips, player_bb | flips | bit))
+                score = mobility * 2 + (0 if bit & odd else 1)
+            ordered.append((score, sq, flips))
+        ordered.sort()
+        return [(sq, flips) for _, sq, flips in ordered]
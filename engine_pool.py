@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from bitboard import BitBoard
+from minimax_engine import OthelloGame, SearchTimeout
+
+#複数のセッション(ブラウザのページ)で1つの探索プロセスプールを共有する
+#セッションごとの待ち行列から1件ずつ順番に取り出して(ラウンドロビン)ワーカーに渡すので、
+#たくさん依頼したセッションがあっても他のセッションが待たされ続けることはない
+#ワーカーとは盤面を (白, 黒) のビットボードの整数2つだけでやり取りする
+#bookに定跡ファイルのパスを渡すと、各ワーカーが同じファイルをmmapで開いて探索の前に引く
+
+
+#待ち行列がいっぱいで依頼を受け付けられないときの例外
+class EngineBusy(Exception):
+    pass
+
+
+#締め切りまでに探索を始められなかったときの例外
+class EngineTimeout(Exception):
+    pass
+
+
+#探索の依頼1件
+class EngineJob:
+    __slots__ = ("session_id", "white", "black", "player", "depth", "time_limit_ms", "deadline", "future")
+
+    def __init__(self, session_id, white, black, player, depth, time_limit_ms, deadline):
+        self.session_id = session_id
+        self.white = white
+        self.black = black
+        self.player = player
+        self.depth = depth
+        self.time_limit_ms = time_limit_ms
+        self.deadline = deadline
+        self.future = Future()
+
+
+#共有の探索エンジン
+#submitはすぐにFutureを返し、結果は1始まりの座標(row, col)で受け取る
+class EnginePool:
+    def __init__(self, workers=2, max_pending=64, max_per_session=2, timeout_ms=10000,
+                 tt_size_mb=16, eval_weights=None, book=None):
+        self.workers = workers
+        #全体で待たせておける依頼の数と、1セッションあたりの数(超えたらEngineBusy)
+        self.max_pending = max_pending
+        self.max_per_session = max_per_session
+        #依頼してから結果が出るまでの上限
+        self.timeout_ms = timeout_ms
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_pool_worker,
+            initargs=(tt_size_mb, eval_weights, book),
+        )
+        #セッションID → 待ち行列 (先頭のセッションから順に取り出し、取り出したら末尾に回す)
+        self.queues = OrderedDict()
+        self.pending = 0
+        self.running = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.stats = {"submitted": 0, "completed": 0, "rejected": 0, "timeouts": 0, "cancelled": 0}
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self.dispatcher.start()
+
+    #探索を依頼する(待ち行列がいっぱいならEngineBusy)
+    def submit(self, session_id, white, black, player, depth=2, time_limit_ms=None, timeout_ms=None):
+        if timeout_ms is None:
+            timeout_ms = self.timeout_ms
+        job = EngineJob(session_id, white, black, player, depth, time_limit_ms,
+                        time.perf_counter() + timeout_ms / 1000)
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("EnginePool is closed")
+            queue = self.queues.get(session_id)
+            if self.pending >= self.max_pending or (queue is not None and len(queue) >= self.max_per_session):
+                self.stats["rejected"] += 1
+                raise EngineBusy(f"engine queue is full ({self.pending} pending)")
+            if queue is None:
+                queue = self.queues[session_id] = deque()
+            queue.append(job)
+            self.pending += 1
+            self.stats["submitted"] += 1
+            self.cond.notify()
+        return job.future
+
+    #セッションの待っている依頼をすべて取り消す(実行中の探索は終わるまで待たず、結果は捨てられる)
+    def cancel_session(self, session_id):
+        with self.cond:
+            queue = self.queues.pop(session_id, None)
+            if queue is None:
+                return 0
+            for job in queue:
+                job.future.cancel()
+            self.pending -= len(queue)
+            self.stats["cancelled"] += len(queue)
+            return len(queue)
+
+    #プールを終了する
+    def close(self):
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            for queue in self.queues.values():
+                for job in queue:
+                    job.future.cancel()
+            self.queues.clear()
+            self.pending = 0
+            self.cond.notify_all()
+        self.dispatcher.join()
+        self.executor.shutdown(cancel_futures=True)
+
+    #空いているワーカーに依頼を渡し続ける
+    def _dispatch_loop(self):
+        with self.cond:
+            while not self.closed:
+                self._expire_jobs()
+                if self.running >= self.workers or not self.pending:
+                    self.cond.wait(0.1)
+                    continue
+                job = self._next_job()
+                if job.future.set_running_or_notify_cancel():
+                    self._start_job(job)
+
+    #先頭のセッションから1件取り出し、そのセッションを末尾に回す
+    def _next_job(self):
+        session_id, queue = next(iter(self.queues.items()))
+        job = queue.popleft()
+        if queue:
+            self.queues.move_to_end(session_id)
+        else:
+            del self.queues[session_id]
+        self.pending -= 1
+        return job
+
+    #締め切りを過ぎた依頼と取り消された依頼を待ち行列から除く
+    def _expire_jobs(self):
+        now = time.perf_counter()
+        for session_id, queue in list(self.queues.items()):
+            if all(now < job.deadline and not job.future.cancelled() for job in queue):
+                continue
+            keep = deque()
+            for job in queue:
+                if job.future.cancelled():
+                    self.stats["cancelled"] += 1
+                elif now >= job.deadline:
+                    if job.future.set_running_or_notify_cancel():
+                        job.future.set_exception(EngineTimeout("engine request timed out in the queue"))
+                    self.stats["timeouts"] += 1
+                else:
+                    keep.append(job)
+            self.pending -= len(queue) - len(keep)
+            if keep:
+                self.queues[session_id] = keep
+            else:
+                del self.queues[session_id]
+
+    #ワーカーで探索を始める(締め切りまでの残り時間を渡す)
+    def _start_job(self, job):
+        self.running += 1
+        remaining_ms = max(1.0, (job.deadline - time.perf_counter()) * 1000)
+        try:
+            future = self.executor.submit(_pool_search, job.white, job.black, job.player,
+                                          job.depth, job.time_limit_ms, remaining_ms)
+        except Exception as e:
+            #プロセスプールが壊れているとき(BrokenProcessPoolなど)は依頼元に例外を渡し、配る処理は続ける
+            self.running -= 1
+            job.future.set_exception(e)
+            return
+        future.add_done_callback(lambda f, job=job: self._finish_job(job, f))
+
+    #ワーカーの結果を依頼元のFutureに渡す
+    def _finish_job(self, job, future):
+        with self.cond:
+            self.running -= 1
+            self.stats["completed"] += 1
+            self.cond.notify()
+        if future.cancelled():
+            job.future.set_exception(EngineTimeout("engine pool was closed"))
+        elif future.exception() is not None:
+            job.future.set_exception(future.exception())
+        else:
+            job.future.set_result(future.result())
+
+
+#ワーカープロセスごとの探索エンジン
+_pool_game = None
+_pool_endgame_time_ms = None
+
+#ワーカープロセスの初期化
+def _init_pool_worker(tt_size_mb, eval_weights, book):
+    global _pool_game, _pool_endgame_time_ms
+    _pool_game = OthelloGame(tt_size_mb=tt_size_mb, eval_weights=eval_weights, book=book)
+    _pool_endgame_time_ms = _pool_game.endgame_time_ms
+
+#ワーカーで1件の依頼を探索して最善手を返す
+#深さ固定の探索が締め切りに間に合わなければ、1手読みの手を返す
+def _pool_search(white, black, player, depth, time_limit_ms, timeout_ms):
+    game = _pool_game
+    game.set_position(BitBoard(white, black), player)
+    game.endgame_time_ms = min(_pool_endgame_time_ms, timeout_ms / 2)
+    if time_limit_ms is not None:
+        return game.ai_move(depth, time_limit_ms=min(time_limit_ms, timeout_ms))
+
+    game.deadline = time.perf_counter() + timeout_ms / 1000
+    try:
+        return game.ai_move(depth)
+    except SearchTimeout:
+        pass
+    finally:
+        game.deadline = None
+    return game.ai_move(1)
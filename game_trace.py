@@ -0,0 +1,95 @@
+import logging
+import sys
+import time
+from collections import deque
+from bitboard import BitBoard
+
+#ゲームのログと棋譜のトレース
+#ログは標準のloggingを使う("reversi"の下にまとめる)。盤面の文字列化は出力するときだけ行う
+#トレースは直近の出来事をリングバッファに生のまま残しておき、dumpしたときに初めて文字列にする
+#トレースを有効にしていないゲームはtraceがNoneで、1手ごとの処理はNoneの確認だけになる
+
+logger = logging.getLogger("reversi")
+
+STONE_NAMES = {1: "白", -1: "黒"}
+
+
+#盤面を1行ずつの文字列にする(番兵の"w"で囲んだ10x10の形で並べる)
+def format_board(board):
+    if isinstance(board, BitBoard):
+        board = board.to_padded()
+    return "\n".join(" ".join(f"{str(cell):>2}" for cell in row) for row in board)
+
+
+#ログに渡すと、実際に出力されるときだけ関数を呼んで文字列にする
+class LazyFormat:
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+#ログの出力先とレベルを設定する(環境変数などから呼び出し側で決める)
+def configure_logging(level=logging.WARNING, stream=None):
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+#1ゲーム分の直近の出来事を残しておくリングバッファ
+#record(種類, データ...)はタプルを積むだけで、古いものはmaxlenを超えると捨てられる
+class GameTrace:
+    def __init__(self, maxlen=256):
+        self.events = deque(maxlen=maxlen)
+        self.dropped = 0
+
+    #出来事を記録する(データは文字列にせずそのまま残す)
+    def record(self, kind, *data):
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append((time.perf_counter(), kind, data))
+
+    def clear(self):
+        self.events.clear()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    #記録を読める形の行にする
+    def lines(self):
+        if not self.events:
+            return []
+        start = self.events[0][0]
+        lines = []
+        if self.dropped:
+            lines.append(f"... {self.dropped} events dropped")
+        for t, kind, data in self.events:
+            lines.append(f"{(t - start) * 1000:9.1f}ms {kind:<6} {self.format_event(kind, data)}")
+        return lines
+
+    #出来事の種類ごとの表示
+    def format_event(self, kind, data):
+        if kind == "move":
+            player, (row, col), flips = data
+            return f"{STONE_NAMES[player]} ({row}, {col}) {len(flips)}枚返す {flips}"
+        if kind == "pass":
+            return f"{STONE_NAMES[data[0]]}はパス"
+        if kind == "start":
+            return f"{STONE_NAMES[data[0]]}が先行"
+        if kind == "end":
+            white, black = data
+            return f"白:{white} 黒:{black}"
+        return " ".join(map(str, data))
+
+    #記録を書き出す(outを省略すると標準エラー出力)
+    def dump(self, out=None):
+        out = out or sys.stderr
+        for line in self.lines():
+            print(line, file=out)
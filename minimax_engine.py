@@ -0,0 +1,570 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from bitboard import NEIGHBOURS, BitBoard, get_flips, get_frontier, get_moves, iter_squares, popcount, square_index, square_pos
+from endgame import EndgameSolver, SolveTimeout
+from opening_book import OpeningBook
+from move_ordering import SQUARE_PRIORITY, MoveOrderer
+from pattern_eval import PatternEvaluator
+from transposition import EXACT, LOWER, UPPER, NO_MOVE, TranspositionTable, pass_hash, update_hash, zobrist_hash
+
+#ミニマックス法のAIの探索エンジン(GUIを読み込まずに使えるようにReversi_MiniMax.pyから分けている)
+#探索はネガマックス法(評価値はいつも手番側から見た値)で、SearchStatsなど外に見せる評価値だけ白から見た値にする
+
+#反復深化で前の深さの評価値のまわりに取る窓の半分の幅と、これ以上広げるなら窓をなくす幅
+ASPIRATION_WINDOW = 160
+ASPIRATION_LIMIT = 5000
+
+#持ち時間を使い切ったときに探索を打ち切るための例外
+class SearchTimeout(Exception):
+    pass
+
+#stop_searchで探索が中止されたときの例外
+class SearchCancelled(Exception):
+    pass
+
+#オセロの内部を定義
+class OthelloGame:
+    def __init__(self, tt_size_mb=16, endgame_empties=12, endgame_time_ms=2000, workers=1, eval_weights=None, book=None):
+        self.board_size = 8
+        self.DIRECTIONS = [
+            (-1, 0),   # 上
+            (1, 0),    # 下
+            (0, -1),   # 左
+            (0, 1),    # 右
+            (-1, -1),  # 左上
+            (-1, 1),   # 右上
+            (1, -1),   # 左下
+            (1, 1),    # 右下
+        ]
+        self.board_state = None
+        self.current_player = None
+        self.user_player = None
+        self.ai_player = None
+        self.valid_moves = []
+        self.white_count = 0
+        self.black_count = 0
+        self.flippable_pos = []
+        #石に隣接する空きマス(合法手の候補)
+        self.frontier = 0
+        #置換表はai_moveをまたいで使い回す(自分で探索しないセッションでは確保しないよう、最初の探索で確保する)
+        self.tt_size_mb = tt_size_mb
+        self.tt = None
+        #パターン評価関数(eval_weightsに重みファイルを指定できる)
+        self.eval_weights = eval_weights
+        self.evaluator = PatternEvaluator(eval_weights)
+        #時間制限つき探索の締め切り(Noneなら制限なし)
+        self.deadline = None
+        #stop_searchが呼ばれたらTrue(探索中のai_moveはSearchCancelledで抜ける)
+        self.stop_requested = False
+        #探索中に一定ノードごとに呼ばれる関数(引数はこのオブジェクト)
+        self.on_progress = None
+        #手の並べ替え(同じメソッドを持つオブジェクトに差し替え可能)
+        self.move_orderer = MoveOrderer()
+        #空きマスがendgame_empties以下になったら終盤ソルバーで読み切る
+        self.endgame_solver = EndgameSolver()
+        self.endgame_empties = endgame_empties
+        self.endgame_time_ms = endgame_time_ms
+        #定跡(OpeningBookか定跡ファイルのパス)にある局面は探索せずに定跡の手を打つ
+        self.book = OpeningBook(book) if isinstance(book, str) else book
+        #workersが2以上なら深さ固定の探索でルートの手を複数プロセスに分ける
+        self.workers = workers
+        self.executor = None
+        self.shared_best = None
+        #探索の統計(ノード数・評価した葉の数・置換表で局面が見つかった数・直前のルートの各手の評価値)
+        self.nodes = 0
+        self.leaves = 0
+        self.tt_hits = 0
+        self.root_scores = []
+
+    #ボードを初期化(白と黒のビットボード)
+    def initialize_board(self):
+        return BitBoard.initial()
+
+    #ゲームを初期化
+    def initialize_game(self, first_player):
+        self.set_position(self.initialize_board(), first_player)
+
+    #盤面と手番を設定し、石の数・合法手・合法手の候補を計算し直す
+    def set_position(self, board, player):
+        self.current_player = player
+        self.board_state = board
+        self.valid_moves = self.find_valid_moves(self.board_state, self.current_player)
+        self.white_count, self.black_count = self.count_stones(self.board_state)
+        self.flippable_pos = []
+        self.frontier = get_frontier(self.board_state.white, self.board_state.black)
+
+    #プレイヤーの切り替え
+    def change_player(self, current_player):
+        return -current_player
+
+    #石を数える
+    def count_stones(self, board_state):
+        return popcount(board_state.white), popcount(board_state.black)
+
+    #石の数から勝者を決める
+    def judge_winner(self):
+        if self.white_count > self.black_count:
+            return "白の勝ちです！"
+        elif self.black_count > self.white_count:
+            return "黒の勝ちです！"
+        else:
+            return "引き分けです！"
+
+    #石を置けるかを判定
+    def can_place_stone(self, board, row, col, player):
+        sq = square_index(row, col)
+        if ((board.white | board.black) >> sq) & 1:
+            return False
+        p, o = board.split(player)
+        return get_flips(p, o, sq) != 0
+
+    #石が置けるマスを探す
+    def find_valid_moves(self, board, player):
+        p, o = board.split(player)
+        return [square_pos(sq) for sq in iter_squares(get_moves(p, o))]
+
+    #ひっくり返せる場所を探す
+    def find_flippable(self, board, row, col, player):
+        p, o = board.split(player)
+        return [square_pos(sq) for sq in iter_squares(get_flips(p, o, square_index(row, col)))]
+
+    #オセロの状態を更新
+    #石の数と合法手の候補は、置いたマスとひっくり返ったマスだけから差分で更新する
+    def update_state(self, row, col):
+        player = self.current_player
+        sq = square_index(row, col)
+        flips = self.simulate_move(self.board_state, row, col, player)
+        self.flippable_pos = [square_pos(f) for f in iter_squares(flips)]
+
+        n = popcount(flips)
+        if player == 1:
+            self.white_count += n + 1
+            self.black_count -= n
+        else:
+            self.black_count += n + 1
+            self.white_count -= n
+        self.frontier = (self.frontier | NEIGHBOURS[sq]) & ~(self.board_state.white | self.board_state.black)
+
+        #相手が置けなければもう一度自分の番、どちらも置けなければ終了
+        for nxt in (self.change_player(player), player):
+            p, o = self.board_state.split(nxt)
+            moves = get_moves(p, o, self.frontier)
+            if moves:
+                self.current_player = nxt
+                self.valid_moves = [square_pos(m) for m in iter_squares(moves)]
+                return
+        self.current_player = 0  # 終了
+        self.valid_moves = []
+
+    #探索せずに決める手(マスの優先度がいちばん高い合法手)
+    #置換表も終盤ソルバーも使わないので、共有のエンジンが混み合っていて依頼できないときに使う
+    def quick_move(self):
+        return max(self.valid_moves, key=lambda m: SQUARE_PRIORITY[square_index(*m)])
+
+    #ミニマックス法を用いたAI
+    #time_limit_msを指定すると、時間内で反復深化して最後に読み切った深さの最善手を返す
+    #statsにSearchStatsを渡すと、反復ごとのノード数・時間・読み筋・ルートの各手の評価値を記録する
+    def ai_move(self, depth=2, time_limit_ms=None, stats=None):
+        if stats is None:
+            return self._ai_move(depth, time_limit_ms, None)
+        move = None
+        stats.start()
+        try:
+            move = self._ai_move(depth, time_limit_ms, stats)
+        finally:
+            stats.finish(move)
+        return move
+
+    def _ai_move(self, depth, time_limit_ms, stats):
+        start = time.perf_counter()
+        moves = self.find_valid_moves(self.board_state, self.current_player)
+        if not moves:
+            return None
+
+        if self.book is not None:
+            hit = self.book.probe(*self.board_state.split(self.current_player))
+            if hit is not None:
+                sq, score, book_depth = hit
+                if stats is not None:
+                    stats.add_iteration(book_depth, square_pos(sq), score * self.current_player,
+                                        [square_pos(sq)], [], (0, 0, 0, 0), book=True)
+                return square_pos(sq)
+
+        #探索用の盤面は1つだけ用意し、手を打って戻しながら探索する
+        board = self.board_state.copy()
+
+        #空きマスが少なければ最後まで読み切る(時間内に読み切れなければ通常の探索に戻る)
+        if board.empty_count() <= self.endgame_empties:
+            budget = self.endgame_time_ms if time_limit_ms is None else time_limit_ms / 2
+            p, o = board.split(self.current_player)
+            try:
+                sq, score = self.endgame_solver.solve(p, o, time_limit_ms=budget)
+                if stats is not None:
+                    stats.add_iteration(board.empty_count(), square_pos(sq), score * self.current_player,
+                                        [square_pos(sq)], [], (self.endgame_solver.nodes, 0, 0, 0), endgame=True)
+                return square_pos(sq)
+            except SolveTimeout:
+                if self.stop_requested:
+                    raise SearchCancelled
+
+        self.prepare_search()
+        player = self.current_player
+        if time_limit_ms is None:
+            if self.workers > 1 and len(moves) > 1:
+                best_move, best_val = self.parallel_search_root(board, moves, depth, player)
+                if stats is not None:
+                    self.record_iteration(stats, board, depth, best_move, best_val)
+                return best_move
+            #深さ固定でも浅い深さから順に読む(前の深さの結果で窓と手の順番が決まり、読むノードが減る)
+            for d, best_move, best_val in self.iterative_deepening(board, moves, depth, player):
+                if stats is not None:
+                    self.record_iteration(stats, board, d, best_move, best_val)
+            return best_move
+
+        self.deadline = start + time_limit_ms / 1000
+        best_move = moves[0]
+        d = 0
+        try:
+            #空きマスの数より深く読んでも結果は変わらない
+            for d, best_move, best_val in self.iterative_deepening(board, moves, board.empty_count(), player):
+                if stats is not None:
+                    self.record_iteration(stats, board, d, best_move, best_val)
+                if time.perf_counter() >= self.deadline:
+                    break
+        except SearchTimeout:
+            if stats is not None:
+                stats.add_iteration(d + 1, None, None, [], self.white_scores(self.root_scores, player),
+                                    self.search_counters(), complete=False)
+        finally:
+            self.deadline = None
+        return best_move
+
+    #探索の準備(置換表がまだなければ確保する)
+    def prepare_search(self):
+        if self.tt is None:
+            self.tt = TranspositionTable(self.tt_size_mb)
+        self.tt.new_search()
+        self.move_orderer.new_search()
+        self.nodes = 0
+        self.leaves = 0
+        self.tt_hits = 0
+
+    #読み終えた深さの統計をstatsに加える(読み筋は最善手の先を置換表からたどる)
+    #best_valとroot_scoresは手番側から見た値なので、白から見た値にして渡す
+    def record_iteration(self, stats, board, depth, best_move, best_val):
+        player = self.current_player
+        flips = self.simulate_move(board, *best_move, player)
+        pv = [best_move] + self.principal_variation(board, -player, depth - 1)
+        self.undo_move(board, *best_move, player, flips)
+        stats.add_iteration(depth, best_move, best_val * player, pv, self.white_scores(self.root_scores, player),
+                            self.search_counters())
+
+    #playerから見た (手, 評価値) のリストを白から見た値にする
+    def white_scores(self, scores, player):
+        return [(move, score * player) for move, score in scores]
+
+    #探索を始めてからの (ノード数, 葉の数, カット数, 置換表ヒット数)
+    def search_counters(self):
+        return self.nodes, self.leaves, self.move_orderer.cutoffs, self.tt_hits
+
+    #置換表に残っている手をたどって、max_length手までの読み筋を返す(パスはNone)
+    def principal_variation(self, board, player, max_length):
+        board = board.copy()
+        key = zobrist_hash(board, player)
+        pv = []
+        length = 0
+        while length < max_length:
+            moves = self.find_valid_moves(board, player)
+            if not moves:
+                if not self.find_valid_moves(board, self.change_player(player)):
+                    break
+                pv.append(None)
+                player = self.change_player(player)
+                key = pass_hash(key)
+                continue
+            entry = self.tt.probe(key)
+            if entry is None or entry[3] == NO_MOVE or square_pos(entry[3]) not in moves:
+                break
+            move = square_pos(entry[3])
+            flips = self.simulate_move(board, *move, player)
+            key = update_hash(key, entry[3], flips, player)
+            player = self.change_player(player)
+            pv.append(move)
+            length += 1
+        return pv
+
+    #ルートの手をdepthまで読んで (最善手, 手番側から見た評価値) を返す
+    #orderは手を調べる順番(movesの添字) 同点の手があればmovesで前にある手を選ぶ
+    #最初の手だけを(alpha, beta)の窓で読み、残りの手は幅1の窓でそれまでの最善値を超えるかだけを確かめて、
+    #超えたときだけ読み直す(PVS) 窓の外に出たときは、評価値は窓の端を超えた側の値(上限か下限)になる
+    def search_root(self, board, moves, depth, player, alpha=float('-inf'), beta=float('inf'), order=None):
+        if order is None:
+            order = range(len(moves))
+        alpha_orig = alpha
+        best_score, best_move, best_index = float('-inf'), None, len(moves)
+        opponent = self.change_player(player)
+        self.root_scores = []
+
+        key = zobrist_hash(board, player)
+        for i, index in enumerate(order):
+            r, c = moves[index]
+            flips = self.simulate_move(board, r, c, player)
+            child_key = update_hash(key, square_index(r, c), flips, player)
+            if i == 0:
+                score = -self.negamax(board, depth - 1, opponent, -beta, -alpha, child_key, ply=1)
+            else:
+                #movesで前にある手は同点でも選ばれるので、同点を見分けられるように窓を1つ下げる
+                bound = alpha - 1 if index < best_index else alpha
+                score = -self.negamax(board, depth - 1, opponent, -bound - 1, -bound, child_key, ply=1)
+                if bound < score < beta and depth > 1:
+                    score = -self.negamax(board, depth - 1, opponent, -beta, -bound, child_key, ply=1)
+            self.undo_move(board, r, c, player, flips)
+            self.root_scores.append(((r, c), score))
+            if score > best_score or (score == best_score and index < best_index):
+                best_score, best_move, best_index = score, (r, c), index
+                alpha = max(alpha, score)
+                if alpha >= beta:
+                    break
+        if alpha_orig < best_score < beta:
+            self.tt.store(key, depth, EXACT, best_score, square_index(*best_move))
+        return best_move, best_score
+
+    #前の深さの評価値guessを中心にした窓で読み、窓の外に出たらその側の窓を広げて読み直す
+    def aspiration_search(self, board, moves, depth, player, guess, order=None):
+        if guess is None:
+            return self.search_root(board, moves, depth, player, order=order)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = guess - delta, guess + delta
+        while True:
+            best_move, score = self.search_root(board, moves, depth, player, alpha, beta, order)
+            if alpha < score < beta:
+                return best_move, score
+            delta *= 4
+            if score <= alpha:
+                alpha = guess - delta if delta < ASPIRATION_LIMIT else float('-inf')
+            else:
+                beta = guess + delta if delta < ASPIRATION_LIMIT else float('inf')
+
+    #深さ1からmax_depthまで1つずつ深く読み、読み終えるごとに (深さ, 最善手, 手番側から見た評価値) を返す
+    #2回目からは前の深さの評価値を窓の中心にし、ルートの手も前の深さの評価値が高い順に調べる
+    #(浅い読みの結果が置換表に残るので、深い読みでも手の並べ替えがよく効く)
+    def iterative_deepening(self, board, moves, max_depth, player):
+        order = list(range(len(moves)))
+        score = None
+        for depth in range(1, max_depth + 1):
+            best_move, score = self.aspiration_search(board, moves, depth, player, score, order)
+            scores = dict(self.root_scores)
+            order.sort(key=lambda i: (moves[i] == best_move, scores.get(moves[i], float('-inf'))), reverse=True)
+            yield depth, best_move, score
+
+    #ルートの手を複数プロセスに分けて読む(search_rootと同じ手を返す)
+    #最初の手は自分で読み、その値を下限として残りの手をワーカーに配る(Young Brothers Wait)
+    #ワーカー間では共有メモリの (最善値, その手の番号) を下限として使う
+    #(最善手以外のroot_scoresは下限で打ち切った値なので、正確な値とは限らない)
+    def parallel_search_root(self, board, moves, depth, player):
+        executor = self.get_executor()
+
+        r, c = moves[0]
+        flips = self.simulate_move(board, r, c, player)
+        first = -self.negamax(board, depth - 1, self.change_player(player),
+                              float('-inf'), float('inf'), ply=1)
+        self.undo_move(board, r, c, player, flips)
+        self.root_scores = [(moves[0], first)]
+        with self.shared_best.get_lock():
+            self.shared_best[0] = first
+            self.shared_best[1] = 0
+
+        futures = [
+            executor.submit(_search_root_child, board.white, board.black, player, r, c, i, depth)
+            for i, (r, c) in enumerate(moves[1:], start=1)
+        ]
+        best_score, best_move = first, moves[0]
+        for move, future in zip(moves[1:], futures):
+            score, (nodes, leaves, cutoffs, tt_hits) = future.result()
+            self.nodes += nodes
+            self.leaves += leaves
+            self.move_orderer.cutoffs += cutoffs
+            self.tt_hits += tt_hits
+            self.root_scores.append((move, score))
+            if score > best_score:
+                best_score = score
+                best_move = move
+        return best_move, best_score
+
+    #並列探索用のプロセスプールを作る(2回目以降は使い回す)
+    def get_executor(self):
+        if self.executor is None:
+            self.shared_best = multiprocessing.Array("i", 2)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_search_worker,
+                initargs=(self.shared_best, self.tt_size_mb, self.eval_weights),
+            )
+        return self.executor
+
+    #別のスレッドから探索を中止する(このオブジェクトでの以降の探索も中止される)
+    def stop_search(self):
+        self.stop_requested = True
+        self.endgame_solver.stop_requested = True
+
+    #プロセスプールを終了する
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+            self.shared_best = None
+
+    #盤面に石を置いてひっくり返す(ひっくり返した石をビットマスクで返す)
+    def simulate_move(self, board, row, col, player):
+        sq = square_index(row, col)
+        p, o = board.split(player)
+        flips = get_flips(p, o, sq)
+        board.set_split(player, p | flips | (1 << sq), o ^ flips)
+        return flips
+
+    #simulate_moveで打った手を元に戻す
+    def undo_move(self, board, row, col, player, flips):
+        sq = square_index(row, col)
+        p, o = board.split(player)
+        board.set_split(player, p ^ (flips | (1 << sq)), o | flips)
+
+    #ネガマックス法のアルファベータ探索(手番側から見た評価値を返す)
+    #最初の手だけを(alpha, beta)の窓で読み、残りの手は幅1の窓(alpha, alpha + 1)でalphaを超えないことだけを確かめる
+    #超えたときだけ(超えた値, beta)の窓で読み直す(PVS) 評価値は整数なので幅1の窓で大小を決められる
+    def negamax(self, board, depth, player, alpha, beta, key=None, ply=0):
+        #中止・進捗の通知・締め切りは一定ノードごとに確認する
+        self.nodes += 1
+        if not self.nodes & 0xFF:
+            if self.stop_requested:
+                raise SearchCancelled
+            if self.on_progress is not None:
+                self.on_progress(self)
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout
+        if depth == 0:
+            self.leaves += 1
+            return self.evaluate_board(board) * player
+        if key is None:
+            key = zobrist_hash(board, player)
+
+        #置換表に十分な深さの結果があれば使う
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            self.tt_hits += 1
+            tt_depth, tt_flag, tt_value, tt_sq = entry
+            if tt_depth >= depth:
+                if tt_flag == EXACT:
+                    return tt_value
+                if tt_flag == LOWER:
+                    alpha = max(alpha, tt_value)
+                else:
+                    beta = min(beta, tt_value)
+                if alpha >= beta:
+                    return tt_value
+            if tt_sq != NO_MOVE:
+                tt_move = square_pos(tt_sq)
+
+        opponent = self.change_player(player)
+        moves = self.find_valid_moves(board, player)
+        if not moves:
+            #両者とも置けなければゲームオーバー
+            if not self.find_valid_moves(board, opponent):
+                self.leaves += 1
+                return self.final_score(board) * player
+            return -self.negamax(board, depth, opponent, -beta, -alpha, pass_hash(key), ply + 1)
+
+        #置換表の手・キラー手・ヒストリーの順に並べて調べる
+        moves = self.move_orderer.order(moves, ply, tt_move)
+
+        best_move = None
+        alpha_orig = alpha
+        value = float('-inf')
+        for i, (r, c) in enumerate(moves):
+            sq = square_index(r, c)
+            flips = self.simulate_move(board, r, c, player)
+            child_key = update_hash(key, sq, flips, player)
+            if i == 0:
+                child = -self.negamax(board, depth - 1, opponent, -beta, -alpha, child_key, ply + 1)
+            else:
+                child = -self.negamax(board, depth - 1, opponent, -alpha - 1, -alpha, child_key, ply + 1)
+                if alpha < child < beta and depth > 1:
+                    child = -self.negamax(board, depth - 1, opponent, -beta, -child, child_key, ply + 1)
+            self.undo_move(board, r, c, player, flips)
+            if child > value:
+                value = child
+                best_move = sq
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        self.move_orderer.record_cutoff(sq, ply, depth, i)
+                        break
+
+        #探索窓との関係から評価値の種類を決めて保存
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, flag, value, best_move)
+        return value
+
+    #直前のai_moveの探索統計(ノード数と1手目でカットできた割合)
+    #反復ごとの時間や読み筋も欲しいときはai_moveにSearchStatsを渡す
+    def search_stats(self):
+        return {
+            "nodes": self.nodes,
+            "leaves": self.leaves,
+            "tt_hits": self.tt_hits,
+            "cutoffs": self.move_orderer.cutoffs,
+            "first_move_cutoffs": self.move_orderer.first_move_cutoffs,
+            "first_move_cutoff_rate": self.move_orderer.first_move_cutoff_rate(),
+        }
+
+    #ゲームオーバー
+    def is_game_over(self, board):
+        return not get_moves(board.white, board.black) and not get_moves(board.black, board.white)
+
+    #評価値を計算(白から見たパターン評価)
+    def evaluate_board(self, board):
+        return self.evaluator.evaluate(board.white, board.black)
+
+    #終局の評価値(石差で決まり、途中局面のどの評価値よりも優先される)
+    def final_score(self, board):
+        return self.evaluator.final_score(board.white, board.black)
+
+#並列探索のワーカープロセスごとの探索エンジンと共有の最善値
+_worker_game = None
+_shared_best = None
+
+#ワーカープロセスの初期化
+def _init_search_worker(shared_best, tt_size_mb, eval_weights):
+    global _worker_game, _shared_best
+    _worker_game = OthelloGame(tt_size_mb=tt_size_mb, eval_weights=eval_weights)
+    _shared_best = shared_best
+
+#ワーカーでルートの1手(index番目)を読んで (ルートの手番側から見た評価値, (ノード数, 葉の数, カット数, 置換表ヒット数)) を返す
+#まず幅1の窓で下限を超えるかを確かめ、超えたときだけ下限より上の窓で読み直す
+def _search_root_child(white, black, player, row, col, index, depth):
+    game = _worker_game
+    game.prepare_search()
+    with _shared_best.get_lock():
+        best_score, best_index = _shared_best[0], _shared_best[1]
+    #前の手と同点なら前の手が選ばれるので、同点を見分けられるように前の手に対しては下限を1つ下げる
+    bound = best_score if index > best_index else best_score - 1
+
+    board = BitBoard(white, black)
+    game.simulate_move(board, row, col, player)
+    score = -game.negamax(board, depth - 1, -player, -bound - 1, -bound, ply=1)
+    if score > bound and depth > 1:
+        score = -game.negamax(board, depth - 1, -player, float('-inf'), -bound, ply=1)
+
+    #下限を超えたときだけ正確な値なので共有の最善値を更新する
+    if score > bound:
+        with _shared_best.get_lock():
+            if (score, -index) > (_shared_best[0], -_shared_best[1]):
+                _shared_best[0] = score
+                _shared_best[1] = index
+    return score, (game.nodes, game.leaves, game.move_orderer.cutoffs, game.tt_hits)
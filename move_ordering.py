@@ -0,0 +1,75 @@
+from bitboard import square_index
+
+#アルファベータ法で調べる手の順番を決める
+#置換表の手 → キラー手 → ヒストリー + マスの優先度 の順に並べる
+
+#マスごとの優先度 (角を最優先、X打ち・C打ちは最後)
+SQUARE_PRIORITY = (
+    9, 1, 6, 5, 5, 6, 1, 9,
+    1, 0, 3, 3, 3, 3, 0, 1,
+    6, 3, 5, 4, 4, 5, 3, 6,
+    5, 3, 4, 4, 4, 4, 3, 5,
+    5, 3, 4, 4, 4, 4, 3, 5,
+    6, 3, 5, 4, 4, 5, 3, 6,
+    1, 0, 3, 3, 3, 3, 0, 1,
+    9, 1, 6, 5, 5, 6, 1, 9,
+)
+
+MAX_PLY = 128
+TT_MOVE_SCORE = 1 << 40
+KILLER_SCORE = 1 << 30
+
+
+#手の並べ替えとカットの統計
+#OthelloGame.move_ordererを同じメソッドを持つ別のオブジェクトに差し替えれば並べ方を変えられる
+class MoveOrderer:
+    def __init__(self, use_killers=True, use_history=True):
+        self.use_killers = use_killers
+        self.use_history = use_history
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [0] * 64
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    #新しい探索を始める(ヒストリーは半分に減らして引き継ぐ)
+    def new_search(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [h >> 1 for h in self.history]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    #手(1始まりの座標のリスト)を調べる順に並べて返す
+    def order(self, moves, ply, tt_move=None):
+        killers = self.killers[ply] if self.use_killers else (None, None)
+        history = self.history if self.use_history else None
+
+        def score(move):
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            sq = square_index(*move)
+            if sq == killers[0]:
+                return KILLER_SCORE + 1
+            if sq == killers[1]:
+                return KILLER_SCORE
+            if history is None:
+                return SQUARE_PRIORITY[sq]
+            return history[sq] * 16 + SQUARE_PRIORITY[sq]
+
+        return sorted(moves, key=score, reverse=True)
+
+    #betaカットを起こした手を記録する(indexは何番目に調べた手か)
+    def record_cutoff(self, sq, ply, depth, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        killers = self.killers[ply]
+        if killers[0] != sq:
+            killers[1] = killers[0]
+            killers[0] = sq
+        self.history[sq] += depth * depth
+
+    #1手目でカットできた割合
+    def first_move_cutoff_rate(self):
+        if not self.cutoffs:
+            return 0.0
+        return self.first_move_cutoffs / self.cutoffs
@@ -0,0 +1,150 @@
+import argparse
+import mmap
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from bitboard import BitBoard, get_flips, get_moves, iter_squares, popcount, square_index
+from symmetry import ACTION_MAP, INVERSE, canonical
+from transposition import zobrist_hash
+
+#定跡ファイル
+#序盤の局面を深く読んだ結果をあらかじめファイルに書いておき、ai_moveは探索の前にここを引く
+#局面は8つの対称変換で正規化して(symmetry.canonical)、手番側を白とみなしたZobristハッシュをキーにする
+#ファイルは 16バイトのヘッダ + キーの順に並べた12バイトのレコード で、mmapで開いて二分探索する
+#(読み込まずにページキャッシュを参照するだけなので、同じファイルを開いた全プロセスで1つのコピーを共有する)
+#  python opening_book.py book.bin --plies 6 --depth 6 --workers 4   # 定跡を作る
+
+MAGIC = b"RVBOOK1\0"
+#ヘッダ (識別子, レコード数, レコードのバイト数, 収録している局面の最大の石数)
+HEADER = struct.Struct("<8sIHH")
+#レコード (キー, 正規化した座標での手のマス番号, 読んだ深さ, 手番側から見た評価値)
+RECORD = struct.Struct("<QBBh")
+
+
+#正規化した局面のキーと、正規化に使った変換の番号を返す
+def book_key(player_bb, opponent_bb):
+    p, o, k = canonical(player_bb, opponent_bb)
+    return zobrist_hash(BitBoard(p, o), 1), k
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, record_size, self.max_stones = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            self.data.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.count
+
+    #局面を引いて (元の座標での手のマス番号, 手番側から見た評価値, 読んだ深さ) を返す なければNone
+    def probe(self, player_bb, opponent_bb):
+        if popcount(player_bb | opponent_bb) > self.max_stones:
+            return None
+        key, k = book_key(player_bb, opponent_bb)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(self.data, HEADER.size + mid * RECORD.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count:
+            record_key, sq, depth, score = RECORD.unpack_from(self.data, HEADER.size + lo * RECORD.size)
+            if record_key == key:
+                sq = int(ACTION_MAP[INVERSE[k], sq])
+                #ハッシュの衝突で別の局面の手を返さないように、合法手であることを確かめる
+                if (get_moves(player_bb, opponent_bb) >> sq) & 1:
+                    self.hits += 1
+                    return sq, score, depth
+        self.misses += 1
+        return None
+
+    def close(self):
+        self.data.close()
+
+
+#{キー: (正規化した座標での手, 深さ, 評価値)} を定跡ファイルに書き出す
+def write_book(path, entries, max_stones):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries), RECORD.size, max_stones))
+        for key in sorted(entries):
+            sq, depth, score = entries[key]
+            f.write(RECORD.pack(key, sq, depth, max(-32768, min(32767, int(score)))))
+
+
+#初期配置からplies手までに現れる局面を正規化して重複なく集める (手番側, 相手) のリスト
+#パスになる局面は序盤にはほとんど現れないので含めない
+def opening_positions(plies):
+    initial = BitBoard.initial()
+    frontier = {canonical(initial.black, initial.white)[:2]}
+    positions = list(frontier)
+    seen = set(frontier)
+    for _ in range(plies):
+        children = set()
+        for p, o in frontier:
+            for sq in iter_squares(get_moves(p, o)):
+                flips = get_flips(p, o, sq)
+                child = canonical(o ^ flips, p | flips | (1 << sq))[:2]
+                if child not in seen and get_moves(*child):
+                    seen.add(child)
+                    children.add(child)
+        positions.extend(children)
+        frontier = children
+    return positions
+
+
+_book_game = None
+
+#定跡を作るワーカープロセスの初期化
+def _init_book_worker(tt_size_mb):
+    global _book_game
+    from minimax_engine import OthelloGame
+    _book_game = OthelloGame(tt_size_mb=tt_size_mb)
+
+#正規化した局面(手番側を白とする)をdepthまで読んで (手のマス番号, 評価値) を返す
+def _search_book_position(p, o, depth):
+    from search_stats import SearchStats
+    game = _book_game
+    game.set_position(BitBoard(p, o), 1)
+    stats = SearchStats()
+    move = game.ai_move(depth, stats=stats)
+    return square_index(*move), stats.score
+
+
+#定跡を作ってpathに書き出す
+def build_book(path, plies=6, depth=6, workers=1, tt_size_mb=64, verbose=False):
+    positions = opening_positions(plies)
+    entries = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_book_worker, initargs=(tt_size_mb,)) as executor:
+        results = executor.map(_search_book_position, *zip(*positions), repeat(depth), chunksize=16)
+        for i, ((p, o), (sq, score)) in enumerate(zip(positions, results), start=1):
+            entries[book_key(p, o)[0]] = (sq, depth, score)
+            if verbose and i % 100 == 0:
+                print(f"{i}/{len(positions)} positions ({time.perf_counter() - start:.0f}s)", file=sys.stderr)
+    write_book(path, entries, 4 + plies)
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="序盤の局面を深く読んで定跡ファイルを作る")
+    parser.add_argument("output", help="書き出す定跡ファイル")
+    parser.add_argument("--plies", type=int, default=6, help="初期配置から何手目までの局面を収録するか")
+    parser.add_argument("--depth", type=int, default=6, help="各局面を読む深さ")
+    parser.add_argument("--workers", type=int, default=1, help="探索するプロセス数")
+    parser.add_argument("--tt-size-mb", type=int, default=64)
+    args = parser.parse_args(argv)
+    count = build_book(args.output, args.plies, args.depth, args.workers, args.tt_size_mb, verbose=True)
+    print(f"{count} positions -> {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
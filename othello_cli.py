@@ -0,0 +1,137 @@
+import argparse
+import random
+import sys
+import time
+import numpy as np
+from minimax_engine import OthelloGame
+from opening_book import OpeningBook
+from othello_game import OthelloVecEnv
+
+#GUI・TensorFlow・matplotlibを読み込まずに対戦とベンチマークをするコマンド
+#  python othello_cli.py play --black human --white minimax:3
+#  python othello_cli.py play --black minimax:2 --white random --games 20
+#  python othello_cli.py play --black minimax:2 --white minimax:2 --book book.bin
+#  python othello_cli.py bench
+
+STONE_NAMES = {1: "白", -1: "黒"}
+STONE_MARKS = {1: "○", -1: "●", 0: "・"}
+
+
+#盤面を文字で表示する(置ける場所は*)
+def format_board(game):
+    valid = set(game.valid_moves)
+    lines = ["  " + " ".join(str(c) for c in range(1, 9))]
+    for r in range(1, 9):
+        cells = []
+        for c in range(1, 9):
+            cells.append("*" if (r, c) in valid else STONE_MARKS[game.board_state.get(r, c)])
+        lines.append(f"{r} " + " ".join(cells))
+    return "\n".join(lines)
+
+
+#"human" "random" "minimax:3" のような指定から、ゲームを受け取って手を返す関数を作る
+def make_player(spec):
+    name, _, arg = spec.partition(":")
+    if name == "human":
+        return ask_human
+    if name == "random":
+        return lambda game: random.choice(game.valid_moves)
+    if name == "minimax":
+        depth = int(arg or 2)
+        return lambda game: game.ai_move(depth=depth)
+    raise argparse.ArgumentTypeError(f"unknown player: {spec}")
+
+
+#標準入力から「行 列」を読む
+def ask_human(game):
+    while True:
+        print(format_board(game))
+        text = input(f"{STONE_NAMES[game.current_player]}の手 (行 列): ")
+        try:
+            move = tuple(int(x) for x in text.replace(",", " ").split())
+        except ValueError:
+            move = None
+        if move in game.valid_moves:
+            return move
+        print("そこには置けません！")
+
+
+#1局対戦して (白の石数, 黒の石数) を返す
+#bookを渡すとAIは定跡の局面で定跡の手を打つ
+def play_game(players, first_player=-1, verbose=False, book=None):
+    game = OthelloGame(book=book)
+    game.initialize_game(first_player)
+    while game.current_player != 0:
+        move = players[game.current_player](game)
+        if verbose:
+            print(f"{STONE_NAMES[game.current_player]}: {move}")
+        game.update_state(*move)
+    if verbose:
+        print(format_board(game))
+        print(game.judge_winner())
+    return game.white_count, game.black_count
+
+
+def cmd_play(args):
+    players = {-1: make_player(args.black), 1: make_player(args.white)}
+    verbose = args.games == 1
+    wins = {"黒": 0, "白": 0, "引き分け": 0}
+    book = OpeningBook(args.book) if args.book else None
+    for _ in range(args.games):
+        white, black = play_game(players, verbose=verbose, book=book)
+        wins["白" if white > black else "黒" if black > white else "引き分け"] += 1
+    if not verbose:
+        print(" ".join(f"{k}:{v}" for k, v in wins.items()))
+
+
+#手短なベンチマーク(合法手生成の速さとAIの思考時間)
+def cmd_bench(args):
+    env = OthelloVecEnv(args.boards, seed=0)
+    rng = np.random.default_rng(0)
+    moves = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        env.step(rng.integers(0, 64, args.boards))
+        moves += args.boards
+    print(f"vector env ({args.boards} boards): {moves / (time.perf_counter() - start):,.0f} moves/s")
+
+    game = OthelloGame()
+    game.initialize_game(-1)
+    times = []
+    while game.current_player != 0:
+        t = time.perf_counter()
+        move = game.ai_move(depth=args.depth)
+        times.append(time.perf_counter() - t)
+        game.update_state(*move)
+    print(f"ai_move depth {args.depth}: mean {np.mean(times) * 1000:.1f}ms max {max(times) * 1000:.1f}ms over {len(times)} moves")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="オセロの対戦とベンチマーク(GUI・TensorFlowなし)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    play = sub.add_parser("play", help="コンソールで対戦する")
+    play.add_argument("--black", default="human", help="human / random / minimax:深さ")
+    play.add_argument("--white", default="minimax:2", help="human / random / minimax:深さ")
+    play.add_argument("--games", type=int, default=1, help="2以上なら結果の集計だけを表示する")
+    play.add_argument("--book", help="定跡ファイル(opening_book.pyで作る)")
+    play.set_defaults(func=cmd_play)
+
+    bench = sub.add_parser("bench", help="合法手生成とAIの速さを測る")
+    bench.add_argument("--boards", type=int, default=256)
+    bench.add_argument("--seconds", type=float, default=1.0)
+    bench.add_argument("--depth", type=int, default=3)
+    bench.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args(argv)
+    for spec in (getattr(args, "black", None), getattr(args, "white", None)):
+        if spec is not None:
+            try:
+                make_player(spec)
+            except argparse.ArgumentTypeError as e:
+                parser.error(str(e))
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,64 +1,132 @@
 import numpy as np
+from bitboard import BitBoard, bits_to_array, get_flips, get_flips_batch, get_moves, get_moves_batch, iter_squares, popcount, popcount_batch
+
+#盤面はビットボードで持ち、学習に渡すときだけ8x8の配列(黒:1, 白:-1)にする
+#座標は0始まりの(x, y)で、マス番号は x*8 + y
+BLACK = 1
+WHITE = -1
 
 class OthelloGame:
     def __init__(self):
-        self.board = self.initialize_board()
+        self.bits = self.initialize_board()
         self.current_player = 1  # 1 = 黒, -1 = 白
 
     def initialize_board(self):
-        board = np.zeros((8, 8), dtype=int)
-        board[3][3], board[4][4] = -1, -1  # 白
-        board[3][4], board[4][3] = 1, 1    # 黒
-        return board
+        return BitBoard.initial()  # 白: (3,3),(4,4) 黒: (3,4),(4,3)
+
+    #8x8のint8配列(黒:1, 白:-1)
+    @property
+    def board(self):
+        return self.bits.to_array(white=WHITE, black=BLACK)
+
+    @board.setter
+    def board(self, board):
+        self.bits = BitBoard.from_array(board, white=WHITE, black=BLACK)
+
+    #playerの石と相手の石
+    def split(self, player):
+        if player == BLACK:
+            return self.bits.black, self.bits.white
+        return self.bits.white, self.bits.black
 
     def get_valid_moves(self, player):
-        valid_moves = []
-        directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        for x in range(8):
-            for y in range(8):
-                if self.board[x][y] != 0:
-                    continue
-                for dx, dy in directions:
-                    nx, ny = x + dx, y + dy
-                    found_opponent = False
-                    while 0 <= nx < 8 and 0 <= ny < 8:
-                        if self.board[nx][ny] == -player:
-                            found_opponent = True
-                        elif self.board[nx][ny] == player and found_opponent:
-                            valid_moves.append((x, y))
-                            break
-                        else:
-                            break
-                        nx, ny = nx + dx, ny + dy
-        return valid_moves
+        p, o = self.split(player)
+        return [divmod(sq, 8) for sq in iter_squares(get_moves(p, o))]
 
     def make_move(self, move, player):
         x, y = move
-        self.board[x][y] = player
-        directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            stones_to_flip = []
-            while 0 <= nx < 8 and 0 <= ny < 8:
-                if self.board[nx][ny] == -player:
-                    stones_to_flip.append((nx, ny))
-                elif self.board[nx][ny] == player:
-                    for fx, fy in stones_to_flip:
-                        self.board[fx][fy] = player
-                    break
-                else:
-                    break
-                nx, ny = nx + dx, ny + dy
+        sq = x * 8 + y
+        p, o = self.split(player)
+        flips = get_flips(p, o, sq)
+        p |= flips | (1 << sq)
+        o ^= flips
+        if player == BLACK:
+            self.bits = BitBoard(o, p)
+        else:
+            self.bits = BitBoard(p, o)
 
     def is_game_over(self):
-        return len(self.get_valid_moves(1)) == 0 and len(self.get_valid_moves(-1)) == 0
+        b = self.bits
+        return not get_moves(b.black, b.white) and not get_moves(b.white, b.black)
 
     def get_winner(self):
-        black_score = np.sum(self.board == 1)
-        white_score = np.sum(self.board == -1)
+        black_score = popcount(self.bits.black)
+        white_score = popcount(self.bits.white)
         if black_score > white_score:
             return 1  # 黒の勝ち
         elif white_score > black_score:
             return -1  # 白の勝ち
         else:
             return 0  # 引き分け
+
+
+#N局を同時に1手ずつ進める自己対戦用の環境
+#盤面は黒・白のビットボードの配列(uint64)で持ち、boardsに(N, 8, 8)のint8(黒:1, 白:-1)を用意しておく
+#終局した盤面はstepの中で初期配置に戻す
+class OthelloVecEnv:
+    def __init__(self, num_envs, seed=None):
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng(seed)
+        self.black = np.zeros(num_envs, dtype=np.uint64)
+        self.white = np.zeros(num_envs, dtype=np.uint64)
+        self.player = np.full(num_envs, BLACK, dtype=np.int8)  # 各盤面の手番
+        self.boards = np.zeros((num_envs, 8, 8), dtype=np.int8)
+        self.reset()
+
+    #盤面を初期配置に戻す(indexを省略すると全部、指定するとその盤面だけ)
+    def reset(self, index=None):
+        if index is None:
+            index = slice(None)
+        initial = BitBoard.initial()
+        self.black[index] = initial.black
+        self.white[index] = initial.white
+        self.player[index] = BLACK
+        self.update_boards()
+        return self.boards
+
+    #ビットボードから(N, 8, 8)の盤面を作り直す
+    def update_boards(self):
+        self.boards = bits_to_array(self.black) - bits_to_array(self.white)
+
+    #手番側の石と相手の石
+    def split(self):
+        is_black = self.player == BLACK
+        return np.where(is_black, self.black, self.white), np.where(is_black, self.white, self.black)
+
+    #全盤面の合法手を(N, 64)のboolで返す(終局していない盤面には必ず1つ以上ある)
+    def legal_mask(self):
+        p, o = self.split()
+        return bits_to_array(get_moves_batch(p, o)).reshape(self.num_envs, 64).astype(bool)
+
+    #全盤面でactions(マス番号 x*8 + y)を打つ 合法手でなければその盤面の合法手からランダムに選ぶ
+    #(実際に打った手, 打った後の盤面, ひっくり返した数, 終局したか, 勝者(黒:1, 白:-1, 引き分け:0)) を返す
+    #終局した盤面は打った後の盤面を返してから初期配置に戻すので、次の手はself.boardsから選ぶ
+    def step(self, actions):
+        n = self.num_envs
+        actions = np.array(actions, dtype=np.int64)
+        mask = self.legal_mask()
+        illegal = ~mask[np.arange(n), actions]
+        if illegal.any():
+            r = self.rng.random((n, 64))
+            r[~mask] = -1.0
+            actions[illegal] = r[illegal].argmax(axis=1)
+
+        p, o = self.split()
+        flips = get_flips_batch(p, o, actions)
+        p = p | flips | (np.uint64(1) << actions.astype(np.uint64))
+        o = o ^ flips
+        is_black = self.player == BLACK
+        self.black = np.where(is_black, p, o)
+        self.white = np.where(is_black, o, p)
+
+        #相手が打てれば交代、相手が打てず自分が打てればもう一度自分、どちらも打てなければ終局
+        opponent_can_move = get_moves_batch(o, p) != 0
+        done = ~opponent_can_move & (get_moves_batch(p, o) == 0)
+        self.player = np.where(opponent_can_move, -self.player, self.player).astype(np.int8)
+
+        winner = np.sign(popcount_batch(self.black).astype(np.int16) - popcount_batch(self.white)).astype(np.int8)
+        self.update_boards()
+        next_boards = self.boards
+        if done.any():
+            self.reset(done)
+        return actions, next_boards, popcount_batch(flips), done, winner
@@ -0,0 +1,305 @@
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from bitboard import FULL_MASK, NOT_A_FILE, NOT_H_FILE, popcount
+
+#パターンによる評価関数
+#辺・隅の3x3・対角線の石の並びを3進数のインデックスに変換し、表を引いて評価値を足し合わせる
+#それに着手可能数・潜在的な着手可能数・確定石・隅の数の特徴を加える
+#評価値はすべて整数で、(手番に関係なく)playerの石から見た値を返す
+
+FILE_A = 0x0101010101010101
+CORNERS = 0x8100000000000081
+
+#終局時の石差にかける倍率(どの評価値よりも大きくする)
+FINAL_SCALE = 100000
+
+WEIGHTS_MAGIC = b"RVPE"
+WEIGHTS_VERSION = 1
+
+#パターンの種類と各インスタンスのマス(対称な位置どうしで同じ順番になるように並べる)
+#インスタンスごとに (取り出し関数, マスの並び) を持つ
+PATTERNS = (
+    ("edge", (
+        (lambda bb: bb & 0xFF, (0, 1, 2, 3, 4, 5, 6, 7)),
+        (lambda bb: bb >> 56, (56, 57, 58, 59, 60, 61, 62, 63)),
+        (lambda bb: ((bb & FILE_A) * 0x0102040810204080 & FULL_MASK) >> 56, (0, 8, 16, 24, 32, 40, 48, 56)),
+        (lambda bb: (((bb >> 7) & FILE_A) * 0x0102040810204080 & FULL_MASK) >> 56, (7, 15, 23, 31, 39, 47, 55, 63)),
+    )),
+    ("corner", (
+        (lambda bb: (bb & 0x7) | ((bb >> 5) & 0x38) | ((bb >> 10) & 0x1C0), (0, 1, 2, 8, 9, 10, 16, 17, 18)),
+        (lambda bb: ((bb >> 5) & 0x7) | ((bb >> 10) & 0x38) | ((bb >> 15) & 0x1C0), (7, 6, 5, 15, 14, 13, 23, 22, 21)),
+        (lambda bb: ((bb >> 40) & 0x7) | ((bb >> 45) & 0x38) | ((bb >> 50) & 0x1C0), (56, 57, 58, 48, 49, 50, 40, 41, 42)),
+        (lambda bb: ((bb >> 45) & 0x7) | ((bb >> 50) & 0x38) | ((bb >> 55) & 0x1C0), (63, 62, 61, 55, 54, 53, 47, 46, 45)),
+    )),
+    ("diag", (
+        (lambda bb: ((bb & 0x8040201008040201) * FILE_A & FULL_MASK) >> 56, (0, 9, 18, 27, 36, 45, 54, 63)),
+        (lambda bb: ((bb & 0x0102040810204080) * FILE_A & FULL_MASK) >> 56, (7, 14, 21, 28, 35, 42, 49, 56)),
+    )),
+)
+
+#パターン以外の特徴 (着手可能数, 潜在的な着手可能数, 確定石, 隅)
+FEATURES = ("mobility", "potential_mobility", "stability", "corner")
+DEFAULT_FEATURE_WEIGHTS = (60, 20, 80, 0)
+
+#重みファイルがないときの初期値に使うマスの重み
+SQUARE_WEIGHTS = (
+    120, -20, 20,  5,  5, 20, -20, 120,
+    -20, -40, -5, -5, -5, -5, -40, -20,
+     20,  -5, 15,  3,  3, 15,  -5,  20,
+      5,  -5,  3,  3,  3,  3,  -5,   5,
+      5,  -5,  3,  3,  3,  3,  -5,   5,
+     20,  -5, 15,  3,  3, 15,  -5,  20,
+    -20, -40, -5, -5, -5, -5, -40, -20,
+    120, -20, 20,  5,  5, 20, -20, 120,
+)
+
+
+#取り出した石のビット列から3進数のインデックスへの変換表を作る
+#取り出し関数ごとにビットの並びが違うので、1マスずつ試して対応を調べる
+def _build_ternary_table(gather, squares):
+    bit_weights = {}
+    for i, sq in enumerate(squares):
+        g = gather(1 << sq)
+        assert g and not g & (g - 1), "gather must map one square to one bit"
+        bit_weights[g.bit_length() - 1] = 3 ** i
+    size = 1 << (max(bit_weights) + 1)
+    table = array("i", [0]) * size
+    for g in range(size):
+        table[g] = sum(w for bit, w in bit_weights.items() if g >> bit & 1)
+    return table
+
+
+#着手可能数の特徴に使う、両者の合法手の近似 (player_bbの手, opponent_bbの手)
+#各方向に相手の石を2個までしかたどらない(実際の対局の局面では合法手の9割ほどが見つかる)
+#下位64ビットに自分、上位64ビットに相手を並べた128ビットの整数で、両者を1回で調べる
+#相手の石のマスクが端の列・行を除いているので、途中の値が上下の64ビットをまたぐことはない
+def _short_moves_pair(player_bb, opponent_bb):
+    p = player_bb | (opponent_bb << 64)
+    o = opponent_bb | (player_bb << 64)
+    empty = ~(player_bb | opponent_bb) & FULL_MASK
+
+    #左右
+    m = o & 0x7E7E7E7E7E7E7E7E7E7E7E7E7E7E7E7E
+    fl = m & (p << 1)
+    fr = m & (p >> 1)
+    fl |= m & (fl << 1)
+    fr |= m & (fr >> 1)
+    moves = (fl << 1) | (fr >> 1)
+
+    #上下
+    m = o & 0x00FFFFFFFFFFFF0000FFFFFFFFFFFF00
+    fl = m & (p << 8)
+    fr = m & (p >> 8)
+    fl |= m & (fl << 8)
+    fr |= m & (fr >> 8)
+    moves |= (fl << 8) | (fr >> 8)
+
+    #斜め
+    m = o & 0x007E7E7E7E7E7E00007E7E7E7E7E7E00
+    fl = m & (p << 7)
+    fr = m & (p >> 7)
+    fl |= m & (fl << 7)
+    fr |= m & (fr >> 7)
+    moves |= (fl << 7) | (fr >> 7)
+    fl = m & (p << 9)
+    fr = m & (p >> 9)
+    fl |= m & (fl << 9)
+    fr |= m & (fr >> 9)
+    moves |= (fl << 9) | (fr >> 9)
+
+    moves &= empty | (empty << 64)
+    return moves & FULL_MASK, moves >> 64
+
+
+#石に隣接するマス(8方向に1マス広げたもの)
+def _dilate(bb):
+    return (
+        (bb << 8) | (bb >> 8)
+        | ((bb << 1) & NOT_A_FILE) | ((bb >> 1) & NOT_H_FILE)
+        | ((bb << 9) & NOT_A_FILE) | ((bb >> 7) & NOT_A_FILE)
+        | ((bb << 7) & NOT_H_FILE) | ((bb >> 9) & NOT_H_FILE)
+    ) & FULL_MASK
+
+
+#辺のインデックスごとの確定石の差(自分 - 相手)
+#隅から同じ色が続いている石と、空きのない辺の石を確定石とみなす
+@lru_cache(maxsize=None)
+def _edge_stability_table():
+    table = array("b", [0]) * (3 ** 8)
+    for idx in range(3 ** 8):
+        cells = [idx // 3 ** i % 3 for i in range(8)]
+        if 0 not in cells:
+            stable = [True] * 8
+        else:
+            stable = [False] * 8
+            for order in (range(8), range(7, -1, -1)):
+                first = cells[order[0]]
+                for i in order:
+                    if first == 0 or cells[i] != first:
+                        break
+                    stable[i] = True
+        table[idx] = sum((1 if c == 1 else -1) for c, st in zip(cells, stable) if st and c)
+    return table
+
+
+#マスの重みから作る初期のパターン表(プロセスごとに1回だけ作る)
+#複数のパターンに含まれるマスは重みを等分し、隅が空いているときだけX打ちを減点する
+#等分は絶対値で切り捨ててから符号を付ける(白黒を入れ替えた局面で評価値の符号がちょうど反転するように)
+@lru_cache(maxsize=None)
+def _default_tables():
+    coverage = [0] * 64
+    for _, instances in PATTERNS:
+        for _, squares in instances:
+            for sq in squares:
+                coverage[sq] += 1
+    tables = []
+    for name, instances in PATTERNS:
+        squares = instances[0][1]
+        n = len(squares)
+        table = array("h", [0]) * (3 ** n)
+        for idx in range(3 ** n):
+            cells = [idx // 3 ** i % 3 for i in range(n)]
+            value = 0
+            for cell, sq in zip(cells, squares):
+                if cell == 0:
+                    continue
+                w = SQUARE_WEIGHTS[sq]
+                if name == "corner" and sq == 9 and cells[0] != 0:
+                    w = 0
+                w = w // coverage[sq] if w >= 0 else -(-w // coverage[sq])
+                value += w if cell == 1 else -w
+            table[idx] = value
+        tables.append(table)
+    return tuple(tables)
+
+
+#変換表はプロセスごとに1回だけ作る
+@lru_cache(maxsize=None)
+def _index_tables():
+    return tuple(
+        _build_ternary_table(gather, squares)
+        for _, instances in PATTERNS
+        for gather, squares in instances
+    )
+
+
+#int16の配列をリトルエンディアンのバイト列にする
+def _le_bytes(values):
+    data = array("h", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+#パターン表と特徴の重みを持つ評価関数
+class PatternEvaluator:
+    def __init__(self, weights_path=None):
+        #インスタンスごとの3進数インデックスへの変換表(PATTERNSと同じ順番)
+        self.index_tables = _index_tables()
+        self.edge_stability = _edge_stability_table()
+        if weights_path is None:
+            self.tables = list(_default_tables())
+            self.feature_weights = array("h", DEFAULT_FEATURE_WEIGHTS)
+        else:
+            self.load_weights(weights_path)
+
+    #重みファイルを読み込む
+    #形式: マジック(4) バージョン(u16) 表の数(u16) [要素数(u32) int16の配列]... 特徴の重み(int16 x 4) すべてリトルエンディアン
+    def load_weights(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, count = struct.unpack_from("<4sHH", data, 0)
+        if magic != WEIGHTS_MAGIC or version != WEIGHTS_VERSION:
+            raise ValueError(f"{path} は評価関数の重みファイルではありません")
+        if count != len(PATTERNS):
+            raise ValueError(f"{path} のパターン数が一致しません")
+        offset = 8
+        tables = []
+        for _, instances in PATTERNS:
+            (n,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            if n != 3 ** len(instances[0][1]):
+                raise ValueError(f"{path} のパターンの大きさが一致しません")
+            table = array("h")
+            table.frombytes(data[offset:offset + 2 * n])
+            offset += 2 * n
+            tables.append(table)
+        features = array("h")
+        features.frombytes(data[offset:offset + 2 * len(FEATURES)])
+        if sys.byteorder == "big":
+            for a in tables + [features]:
+                a.byteswap()
+        self.tables, self.feature_weights = tables, features
+
+    #重みファイルに保存する
+    def save_weights(self, path):
+        with open(path, "wb") as f:
+            f.write(struct.pack("<4sHH", WEIGHTS_MAGIC, WEIGHTS_VERSION, len(self.tables)))
+            for table in self.tables:
+                f.write(struct.pack("<I", len(table)))
+                f.write(_le_bytes(table))
+            f.write(_le_bytes(self.feature_weights))
+
+    #player_bbから見た評価値
+    #関数呼び出しを減らすため、PATTERNSの取り出し関数をここに展開している(順番も同じ)
+    def evaluate(self, player_bb, opponent_bb):
+        p, o = player_bb, opponent_bb
+        edge, corner, diag = self.tables
+        t0, t1, t2, t3, t4, t5, t6, t7, t8, t9 = self.index_tables
+        w_mob, w_pot, w_stable, w_corner = self.feature_weights
+
+        #辺
+        e0 = t0[p & 0xFF] + 2 * t0[o & 0xFF]
+        e1 = t1[p >> 56] + 2 * t1[o >> 56]
+        e2 = (t2[((p & FILE_A) * 0x0102040810204080 & FULL_MASK) >> 56]
+              + 2 * t2[((o & FILE_A) * 0x0102040810204080 & FULL_MASK) >> 56])
+        e3 = (t3[(((p >> 7) & FILE_A) * 0x0102040810204080 & FULL_MASK) >> 56]
+              + 2 * t3[(((o >> 7) & FILE_A) * 0x0102040810204080 & FULL_MASK) >> 56])
+        score = edge[e0] + edge[e1] + edge[e2] + edge[e3]
+
+        #隅の3x3
+        score += corner[t4[(p & 0x7) | ((p >> 5) & 0x38) | ((p >> 10) & 0x1C0)]
+                        + 2 * t4[(o & 0x7) | ((o >> 5) & 0x38) | ((o >> 10) & 0x1C0)]]
+        score += corner[t5[((p >> 5) & 0x7) | ((p >> 10) & 0x38) | ((p >> 15) & 0x1C0)]
+                        + 2 * t5[((o >> 5) & 0x7) | ((o >> 10) & 0x38) | ((o >> 15) & 0x1C0)]]
+        score += corner[t6[((p >> 40) & 0x7) | ((p >> 45) & 0x38) | ((p >> 50) & 0x1C0)]
+                        + 2 * t6[((o >> 40) & 0x7) | ((o >> 45) & 0x38) | ((o >> 50) & 0x1C0)]]
+        score += corner[t7[((p >> 45) & 0x7) | ((p >> 50) & 0x38) | ((p >> 55) & 0x1C0)]
+                        + 2 * t7[((o >> 45) & 0x7) | ((o >> 50) & 0x38) | ((o >> 55) & 0x1C0)]]
+
+        #対角線
+        score += diag[t8[((p & 0x8040201008040201) * FILE_A & FULL_MASK) >> 56]
+                      + 2 * t8[((o & 0x8040201008040201) * FILE_A & FULL_MASK) >> 56]]
+        score += diag[t9[((p & 0x0102040810204080) * FILE_A & FULL_MASK) >> 56]
+                      + 2 * t9[((o & 0x0102040810204080) * FILE_A & FULL_MASK) >> 56]]
+
+        #確定石は辺のインデックスから表を引く
+        if w_stable:
+            stability = self.edge_stability
+            score += w_stable * (stability[e0] + stability[e1] + stability[e2] + stability[e3])
+        if w_mob:
+            #葉ごとに合法手を2回作るのは重いので、近似の合法手で数える
+            p_moves, o_moves = _short_moves_pair(p, o)
+            score += w_mob * (popcount(p_moves) - popcount(o_moves))
+        if w_pot:
+            empty = ~(p | o) & FULL_MASK
+            score += w_pot * (popcount(_dilate(o) & empty) - popcount(_dilate(p) & empty))
+        if w_corner:
+            score += w_corner * (popcount(p & CORNERS) - popcount(o & CORNERS))
+        return score
+
+    #PATTERNSの取り出し関数を使ってパターン部分だけを計算する(evaluateの展開が正しいかの確認用)
+    def pattern_score(self, player_bb, opponent_bb):
+        score = 0
+        tables = iter(self.index_tables)
+        for weights, (_, instances) in zip(self.tables, PATTERNS):
+            for gather, _ in instances:
+                t = next(tables)
+                score += weights[t[gather(player_bb)] + 2 * t[gather(opponent_bb)]]
+        return score
+
+    #終局の評価値(石差に大きな倍率をかけて、どの途中局面の評価値よりも優先させる)
+    def final_score(self, player_bb, opponent_bb):
+        return (popcount(player_bb) - popcount(opponent_bb)) * FINAL_SCALE
@@ -0,0 +1,147 @@
+import numpy as np
+from symmetry import SYMMETRY_COUNT, transform_actions, transform_boards
+
+#経験を保存するリングバッファ
+#盤面はint8、行動はint16、報酬はfloat32、終局フラグはboolの配列を最初に確保しておき、
+#古いものから上書きする。取り出しは添字の配列でまとめて行う
+#(1遷移あたり 8x8x2 + 2 + 4 + 1 = 135バイトなので、100万件でも約130MB)
+#augment=Trueなら取り出すときに1件ずつランダムな対称変換をかける(保存する量は増やさずに8倍に水増しする)
+
+
+class ReplayBuffer:
+    def __init__(self, capacity, state_shape=(8, 8), augment=False):
+        self.capacity = capacity
+        self.augment = augment
+        self.states = np.zeros((capacity,) + tuple(state_shape), dtype=np.int8)
+        self.next_states = np.zeros((capacity,) + tuple(state_shape), dtype=np.int8)
+        self.actions = np.zeros(capacity, dtype=np.int16)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.position = 0  # 次に書き込む場所
+        self.size = 0
+        self.rng = np.random.default_rng()
+
+    def __len__(self):
+        return self.size
+
+    #1件追加する(stateはstate_shapeに変形できればよい)
+    def add(self, state, action, reward, next_state, done):
+        i = self.position
+        self.states[i] = np.reshape(state, self.states.shape[1:])
+        self.next_states[i] = np.reshape(next_state, self.states.shape[1:])
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return i
+
+    #まとめて追加する(先頭の次元が件数) 書き込んだ場所の添字を返す
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        n = len(actions)
+        index = (self.position + np.arange(n)) % self.capacity
+        shape = (n,) + self.states.shape[1:]
+        self.states[index] = np.reshape(states, shape)
+        self.next_states[index] = np.reshape(next_states, shape)
+        self.actions[index] = actions
+        self.rewards[index] = rewards
+        self.dones[index] = dones
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return index
+
+    #batch_size件を一様に取り出す
+    #(盤面, 行動, 報酬, 次の盤面, 終局, 添字, 重み) を返す 重みは優先度つきのときのための補正で、ここでは全部1
+    def sample(self, batch_size):
+        index = self.rng.integers(0, self.size, batch_size)
+        return self.gather(index) + (index, np.ones(batch_size, dtype=np.float32))
+
+    #添字の経験をまとめて取り出す(augmentなら盤面と行動に同じ対称変換をかける)
+    def gather(self, index):
+        states, actions, next_states = self.states[index], self.actions[index], self.next_states[index]
+        if self.augment:
+            k = self.rng.integers(0, SYMMETRY_COUNT, len(index))
+            states = transform_boards(states, k)
+            next_states = transform_boards(next_states, k)
+            actions = transform_actions(actions, k).astype(np.int16)
+        return states, actions, self.rewards[index], next_states, self.dones[index]
+
+    #優先度を更新する(一様なバッファでは何もしない)
+    def update_priorities(self, index, td_errors):
+        pass
+
+
+#葉に優先度を持ち、親に子の合計を持つ完全二分木
+#根は1番、葉は size + i 番(sizeはcapacity以上の2のべき)
+class SumTree:
+    def __init__(self, capacity):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.size = size
+        self.tree = np.zeros(2 * size, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    #葉の優先度をまとめて設定し、根までの合計を更新する
+    def update(self, index, priorities):
+        node = np.asarray(index) + self.size
+        self.tree[node] = priorities
+        node = np.unique(node // 2)
+        while node[0] >= 1:
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+            if node[0] == 1:
+                break
+            node = np.unique(node // 2)
+
+    #累積和がvaluesになる葉の番号をまとめて探す
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        node = np.ones(len(values), dtype=np.int64)
+        while node[0] < self.size:
+            left = self.tree[2 * node]
+            go_right = values >= left
+            values -= np.where(go_right, left, 0.0)
+            node = 2 * node + go_right
+        return node - self.size
+
+
+#優先度つき経験再生(TD誤差が大きい経験ほど多く取り出す)
+#alphaは優先度の効き具合、betaは偏りを補正する重みの強さ
+class PrioritizedReplayBuffer(ReplayBuffer):
+    def __init__(self, capacity, state_shape=(8, 8), alpha=0.6, beta=0.4, epsilon=1e-3, augment=False):
+        super().__init__(capacity, state_shape, augment)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0
+
+    #新しい経験はこれまでの最大の優先度で入れ、少なくとも1回は取り出されるようにする
+    def add(self, state, action, reward, next_state, done):
+        i = super().add(state, action, reward, next_state, done)
+        self.tree.update([i], self.max_priority)
+        return i
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        index = super().add_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(index, self.max_priority)
+        return index
+
+    #合計をbatch_size等分した区間から1件ずつ取り出す
+    def sample(self, batch_size):
+        total = self.tree.total()
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        index = np.minimum(self.tree.find(values), self.size - 1)
+
+        probs = self.tree.tree[index + self.tree.size] / total
+        weights = (self.size * probs) ** -self.beta
+        weights = (weights / weights.max()).astype(np.float32)
+        return self.gather(index) + (index, weights)
+
+    #学習で求めたTD誤差から優先度を更新する
+    def update_priorities(self, index, td_errors):
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(index, priorities)
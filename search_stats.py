@@ -0,0 +1,104 @@
+import time
+
+#ai_moveの探索統計
+#game.ai_move(depth, stats=SearchStats()) のように渡したときだけ記録する
+#ノード数などはエンジンがいつも数えている整数を反復ごとに読み出すだけなので、渡さないときの手間はほぼない
+#評価値は探索と同じく白から見た値(終盤ソルバーで読み切ったときは白から見た石差)
+#定跡の手を打ったときはbook=Trueで、深さと評価値は定跡を作ったときのもの
+#ルートの各手の評価値は、最善手以外は幅1の窓で打ち切った値(最善手を超えないことを示す上限)のことがある
+#
+#hookには hook(event, stats) を渡せる eventは "start"(探索の前) "iteration"(1つの深さを読み終えるごと) "end"(探索の後)
+#サンプリングプロファイラをstartで開始してendで止めたり、iterationで読んだ深さを印として残したりするのに使う
+#探索の途中で呼ばれる関数が欲しいときはOthelloGame.on_progress(一定ノードごと)を使う
+
+
+class SearchStats:
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.reset()
+
+    def reset(self):
+        self.move = None
+        self.score = None
+        self.depth = 0
+        self.pv = []
+        self.root_scores = []
+        self.endgame = False
+        self.book = False
+        #反復ごとの記録 (深さ, 手, 評価値, 読み筋, ルートの各手の評価値, 各種の数, 時間, 読み終えたか) の辞書
+        #時間切れで打ち切った深さもcomplete=Falseとして残す(手と評価値はNone)
+        self.iterations = []
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = 0
+        self.tt_hits = 0
+        self.seconds = 0.0
+        self._start = None
+        self._last = (0, 0, 0, 0)
+        self._last_time = None
+
+    #探索を始める
+    def start(self):
+        self.reset()
+        self._start = self._last_time = time.perf_counter()
+        if self.hook is not None:
+            self.hook("start", self)
+
+    #1つの深さを読み終えた counters はエンジンの (ノード, 葉, カット, 置換表ヒット) の累計
+    def add_iteration(self, depth, move, score, pv, root_scores, counters, endgame=False, complete=True, book=False):
+        now = time.perf_counter()
+        nodes, leaves, cutoffs, tt_hits = (c - l for c, l in zip(counters, self._last))
+        self._last = counters
+        self.iterations.append({
+            "depth": depth,
+            "move": move,
+            "score": score,
+            "pv": pv,
+            "root_scores": root_scores,
+            "nodes": nodes,
+            "leaves": leaves,
+            "cutoffs": cutoffs,
+            "tt_hits": tt_hits,
+            "seconds": now - self._last_time,
+            "complete": complete,
+        })
+        self._last_time = now
+        if complete:
+            self.depth, self.move, self.score, self.pv, self.root_scores = depth, move, score, pv, root_scores
+            self.endgame = endgame
+            self.book = book
+        self.nodes += nodes
+        self.leaves += leaves
+        self.cutoffs += cutoffs
+        self.tt_hits += tt_hits
+        if self.hook is not None:
+            self.hook("iteration", self)
+
+    #探索を終える(moveはai_moveが返した手 途中で例外になったときはNone)
+    def finish(self, move):
+        self.move = move
+        self.seconds = time.perf_counter() - self._start
+        if self.hook is not None:
+            self.hook("end", self)
+
+    #1秒あたりのノード数
+    def nodes_per_sec(self):
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    #JSONなどに書き出せる形
+    def to_dict(self):
+        return {
+            "move": self.move,
+            "score": self.score,
+            "depth": self.depth,
+            "endgame": self.endgame,
+            "book": self.book,
+            "pv": self.pv,
+            "root_scores": self.root_scores,
+            "nodes": self.nodes,
+            "leaves": self.leaves,
+            "cutoffs": self.cutoffs,
+            "tt_hits": self.tt_hits,
+            "seconds": self.seconds,
+            "iterations": self.iterations,
+        }
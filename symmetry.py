@@ -0,0 +1,103 @@
+import numpy as np
+
+#盤面の8つの対称変換(回転4つ × 裏返しの有無)
+#変換の番号kは 0:そのまま 1:90度回転 2:180度回転 3:270度回転 4:左右反転 5:上下反転 6:転置 7:反対角での転置
+#(回転はnp.rot90と同じ向き)。盤面のマス番号は 行*8 + 列 (0始まり、ビットボードのマス番号と同じ)
+#・配列の盤面(..., 8, 8)と行動(0〜63)の変換 … 経験再生で取り出すときに変換すれば、保存量を増やさずに8倍に水増しできる
+#・ビットボードの変換と正規化 … 対称な局面を同じキーにまとめて、定跡やキャッシュを引けるようにする
+
+SYMMETRY_COUNT = 8
+
+_FULL = 0xFFFFFFFFFFFFFFFF
+
+
+def _array_transforms(x):
+    return (
+        x,
+        np.rot90(x, 1),
+        np.rot90(x, 2),
+        np.rot90(x, 3),
+        np.fliplr(x),
+        np.flipud(x),
+        x.T,
+        np.rot90(x, 2).T,
+    )
+
+
+#SOURCE[k][i]: 変換後のマスiに来る元のマス
+SOURCE = np.array([t.ravel() for t in _array_transforms(np.arange(64).reshape(8, 8))], dtype=np.int64)
+#ACTION_MAP[k][a]: 元のマスaが変換後に行くマス
+ACTION_MAP = np.argsort(SOURCE, axis=1)
+#INVERSE[k]: kを元に戻す変換の番号
+INVERSE = np.array([next(j for j in range(SYMMETRY_COUNT) if (ACTION_MAP[j][ACTION_MAP[k]] == np.arange(64)).all())
+                    for k in range(SYMMETRY_COUNT)], dtype=np.int64)
+
+
+#配列の盤面(..., 8, 8)をk番の変換で写す kは整数か、先頭の次元と同じ長さの配列
+def transform_boards(boards, k):
+    boards = np.asarray(boards)
+    flat = boards.reshape(boards.shape[:-2] + (64,))
+    if np.ndim(k) == 0:
+        return flat[..., SOURCE[k]].reshape(boards.shape)
+    index = SOURCE[np.asarray(k)].reshape((len(k),) + (1,) * (flat.ndim - 2) + (64,))
+    return np.take_along_axis(flat, index, axis=-1).reshape(boards.shape)
+
+
+#行動(マス番号)をk番の変換で写す
+def transform_actions(actions, k):
+    return ACTION_MAP[k, actions]
+
+
+#ビットボードの変換に使う基本の操作
+def flip_vertical(x):
+    return int.from_bytes(x.to_bytes(8, "little"), "big")
+
+
+def mirror_horizontal(x):
+    x = ((x >> 1) & 0x5555555555555555) | ((x & 0x5555555555555555) << 1)
+    x = ((x >> 2) & 0x3333333333333333) | ((x & 0x3333333333333333) << 2)
+    x = ((x >> 4) & 0x0F0F0F0F0F0F0F0F) | ((x & 0x0F0F0F0F0F0F0F0F) << 4)
+    return x
+
+
+def transpose(x):
+    t = 0x0F0F0F0F00000000 & (x ^ (x << 28))
+    x ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (x ^ (x << 14))
+    x ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (x ^ (x << 7))
+    x ^= t ^ (t >> 7)
+    return x & _FULL
+
+
+#ビットボードをk番の変換で写す(transform_boardsと同じ向き)
+def transform_bits(x, k):
+    if k == 0:
+        return x
+    if k == 1:
+        return flip_vertical(transpose(x))
+    if k == 2:
+        return flip_vertical(mirror_horizontal(x))
+    if k == 3:
+        return mirror_horizontal(transpose(x))
+    if k == 4:
+        return mirror_horizontal(x)
+    if k == 5:
+        return flip_vertical(x)
+    if k == 6:
+        return transpose(x)
+    return transpose(flip_vertical(mirror_horizontal(x)))
+
+
+#8つの変換のうち(手番側, 相手)の組が最小になるものを選んで (手番側, 相手, 変換の番号) を返す
+#対称な局面はどれも同じ結果になる 元の座標の手はtransform_actionsで、正規化した座標の手はINVERSEで戻す
+def canonical(player_bb, opponent_bb):
+    best = (player_bb, opponent_bb, 0)
+    for k in range(1, SYMMETRY_COUNT):
+        p = transform_bits(player_bb, k)
+        if p > best[0]:
+            continue
+        o = transform_bits(opponent_bb, k)
+        if (p, o) < best[:2]:
+            best = (p, o, k)
+    return best
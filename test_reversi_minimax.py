@@ -0,0 +1,61 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from engine_pool import EngineBusy
+from Reversi_MiniMax import GUI
+from minimax_engine import OthelloGame
+
+#サーバーモードのAIの手番で、共有のエンジンが使えないときの振る舞いを確かめる
+#ページとエンジンはスタブにして、AIのスレッドはその場で実行する
+
+
+class StubPage:
+    def update(self):
+        pass
+
+    def run_thread(self, func, *args):
+        func(*args)
+
+
+#結果の代わりに例外を返すエンジン
+class FailingEngine:
+    def submit(self, session_id, white, black, player, depth=2, time_limit_ms=None, timeout_ms=None):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+    def cancel_session(self, session_id):
+        return 0
+
+
+#いつも混み合っているエンジン
+class BusyEngine(FailingEngine):
+    def submit(self, *args, **kwargs):
+        raise EngineBusy("engine queue is full")
+
+
+#AIの手番から始まるゲームを用意する
+def start_ai_game(engine):
+    gui = GUI(StubPage(), engine=engine)
+    gui.ai_min_delay = 0.0
+    gui.game = OthelloGame()
+    gui.game.initialize_game(1)
+    gui.game.ai_player = 1
+    gui.game.user_player = -1
+    gui.isgame = True
+    return gui
+
+
+def test_engine_error_resets_thinking_ui():
+    gui = start_ai_game(FailingEngine())
+    gui.start_ai_turn()
+    assert gui.game.current_player == 1
+    assert not gui.thinking_indicator.visible
+    assert "エラー" in gui.info_text.content.value
+
+
+def test_busy_engine_moves_without_search():
+    gui = start_ai_game(BusyEngine())
+    gui.start_ai_turn()
+    assert gui.game.current_player == -1
+    assert gui.game.tt is None
+    assert not gui.thinking_indicator.visible
@@ -1,93 +1,70 @@
+import argparse
+import multiprocessing
+import queue
 import numpy as np
-import matplotlib.pyplot as plt
-from tensorflow.keras.models import Model
-from tensorflow.keras.layers import Input, Dense, Add, Subtract
-from tensorflow.keras.optimizers import Adam
-from othello_game import OthelloGame
+from othello_game import OthelloVecEnv
 from dqn_agent import DQNAgent
 
-#DQNを構築
-def build_model(state_size, action_size):
-    inputs = Input(shape=(state_size,))
-    hidden = Dense(128, activation='relu')(inputs)  
-    hidden = Dense(128, activation='relu')(hidden)
-
-    advantage = Dense(action_size, activation='linear')(hidden)
-    mean_advantage = Dense(1, activation='linear')(advantage)  
-    adjusted_advantage = Subtract()([advantage, mean_advantage])
-
-    value = Dense(1, activation='linear')(hidden)
-    q_values = Add()([value, adjusted_advantage])
-
-    model = Model(inputs=inputs, outputs=q_values)
-    model.compile(optimizer=Adam(learning_rate=0.0005), loss='mse')  
-    return model
+#マスごとの追加報酬
+SQUARE_BONUS = np.zeros(64, dtype=np.float32)
+SQUARE_BONUS[[0, 7, 56, 63]] = 15  # 角を取る行動
+SQUARE_BONUS[[9, 14, 49, 54]] = -10  # 不利なX-square
+SQUARE_BONUS[[1, 8, 15, 6, 48, 57, 55, 62]] = -5  # 不利なC-square
+
+#全盤面の報酬をまとめて計算する(moverは打った側)
+def compute_rewards(actions, flipped, done, winner, mover):
+    reward = flipped.astype(np.float32) + 1  # 置いた石とひっくり返した石の数
+    reward += SQUARE_BONUS[actions]
+    # 勝敗判定後の追加報酬
+    reward += np.where(done & (winner == mover), 30, 0)  # 勝利時の報酬を増加
+    reward -= np.where(done & (winner == -mover), 30, 0)  # 敗北時のペナルティを増加
+    return reward
+
+#全盤面で1手ずつ進める
+#保存する経験 (盤面, 行動, 報酬, 次の盤面, 終局) と、この手で終わった局の累積報酬のリストを返す
+def play_step(agent, env, episode_rewards):
+    states = env.boards
+    mask = env.legal_mask()
+    mover = env.player.copy()
+
+    # 合法手のマスクを渡して全盤面の手をまとめて選ぶ
+    actions = agent.act_batch(states, mask)
+
+    # 全盤面で石を置く(合法手以外は合法手からランダムに選び直される)
+    actions, next_states, flipped, done, winner = env.step(actions)
+    rewards = compute_rewards(actions, flipped, done, winner, mover)
+
+    episode_rewards += rewards
+    finished = episode_rewards[done].tolist()
+    episode_rewards[done] = 0
+    return (states, actions.astype(np.int16), rewards, next_states, done), finished
 
 #訓練する
-def train_dqn(episodes, batch_size=64):
+#num_envs局を同時に進め、1局終わるごとに学習する
+def train_dqn(episodes, batch_size=64, num_envs=16, augment=False):
     state_size = (8, 8)  
     action_size = 64  
-    agent = DQNAgent(state_size, action_size)  
+    agent = DQNAgent(state_size, action_size, augment=augment)  
+    env = OthelloVecEnv(num_envs)
     reward_log = [] 
+    episode_rewards = np.zeros(num_envs, dtype=np.float32)
+
+    while len(reward_log) < episodes:
+        transitions, finished = play_step(agent, env, episode_rewards)
+
+        # 経験をまとめて保存
+        agent.memory.add_batch(*transitions)
+
+        # 終わった局ごとに学習
+        for total_reward in finished:
+            agent.replay(batch_size=batch_size)
+
+            agent.epsilon = max(agent.epsilon * agent.epsilon_decay, agent.epsilon_min)
 
-    for e in range(episodes):
-        game = OthelloGame()
-        state = game.board.reshape(1, 8, 8, 1)  
-        total_reward = 0
-
-        while not game.is_game_over():
-            valid_moves = game.get_valid_moves(game.current_player)
-            if not valid_moves:
-                game.current_player *= -1  
-                continue
-
-            # 合法手のみを渡す
-            valid_actions = [x * 8 + y for x, y in valid_moves]
-            action = agent.act(state, valid_actions)
-            move = (action // 8, action % 8)
-
-            # 合法手以外を選べないようにする
-            if move not in valid_moves:
-                move = valid_moves[np.random.choice(len(valid_moves))]
-
-            # 石を置く処理
-            game.make_move(move, game.current_player)
-            flipped_stones = np.sum(game.board == game.current_player) - np.sum(state[0, :, :, 0] == game.current_player)
-
-            # 報酬
-            reward = flipped_stones  # 石をひっくり返した数
-            if move in [(0, 0), (0, 7), (7, 0), (7, 7)]:  # 角を取る行動
-                reward += 15  # 報酬を増加
-            elif move in [(1, 1), (1, 6), (6, 1), (6, 6)]:  # 不利なX-square
-                reward -= 10
-            elif move in [(0, 1), (1, 0), (1, 7), (0, 6), (6, 0), (7, 1), (6, 7), (7, 6)]:  # 不利なC-square
-                reward -= 5
-
-            # 次の状態を取得
-            next_state = game.board.reshape(1, 8, 8, 1)  # 形状を (1, 8, 8, 1) に変換
-
-            # 勝敗判定後の追加報酬
-            if game.is_game_over():
-                if game.get_winner() == game.current_player:
-                    reward += 30  # 勝利時の報酬を増加
-                elif game.get_winner() == -game.current_player:
-                    reward -= 30  # 敗北時のペナルティを増加
-
-            # 経験を保存して、学習
-            done = game.is_game_over()
-            agent.remember(state, action, reward, next_state, done)
-            state = next_state
-            total_reward += reward
-
-            # ターン交代
-            game.current_player *= -1
-
-        agent.replay(batch_size=batch_size)
-
-        agent.epsilon = max(agent.epsilon * agent.epsilon_decay, agent.epsilon_min)
-
-        reward_log.append(total_reward)
-        print(f"エピソード {e+1}/{episodes} 終了 - 累積報酬: {total_reward}")
+            reward_log.append(total_reward)
+            print(f"エピソード {len(reward_log)}/{episodes} 終了 - 累積報酬: {total_reward}")
+            if len(reward_log) >= episodes:
+                break
 
     # モデルを保存
     agent.save("ver1_fixed.keras")  
@@ -95,8 +72,116 @@ def train_dqn(episodes, batch_size=64):
 
     return reward_log
 
+#複数のプロセスで自己対戦し、1つのプロセスで学習し続ける
+#actor個の対戦プロセスが重みのコピーで対戦して経験を送り、学習側は受け取った経験をリプレイバッファに入れながら学習する
+#学習側はsync_interval回学習するごとに最新の重みと探索率を対戦プロセスに送る
+def train_dqn_parallel(episodes, batch_size=64, actors=4, num_envs=16, sync_interval=50, memory_size=100000,
+                       augment=False):
+    state_size = (8, 8)
+    action_size = 64
+    agent = DQNAgent(state_size, action_size, memory_size=memory_size, augment=augment)
+    reward_log = []
+
+    #TensorFlowを読み込んだプロセスをforkしないようにspawnで起動する
+    ctx = multiprocessing.get_context("spawn")
+    transitions = ctx.Queue(maxsize=actors * 8)  # いっぱいなら対戦側が待つ
+    weight_queues = [ctx.Queue(maxsize=1) for _ in range(actors)]
+    stop = ctx.Event()
+    processes = [
+        ctx.Process(target=actor_loop, args=(i, num_envs, transitions, weight_queues[i], stop), daemon=True)
+        for i in range(actors)
+    ]
+    for p in processes:
+        p.start()
+    send_weights(weight_queues, agent.model.get_weights(), agent.epsilon)
+
+    steps = 0
+    try:
+        while len(reward_log) < episodes:
+            # 届いている経験をリプレイバッファに入れる(1回の学習につき対戦プロセスの数まで、学習できる数がたまるまでは待つ)
+            # episodes局に達したらそれ以降の経験は受け取らない
+            received = 0
+            while len(reward_log) < episodes and (received < actors or len(agent.memory) < batch_size):
+                try:
+                    block = len(agent.memory) < batch_size
+                    batch, finished = transitions.get(timeout=1.0) if block else transitions.get_nowait()
+                except queue.Empty:
+                    if not any(p.is_alive() for p in processes):
+                        raise RuntimeError("all self-play actors exited")
+                    if block:
+                        continue
+                    break
+                received += 1
+                agent.memory.add_batch(*batch)
+                for total_reward in finished:
+                    agent.epsilon = max(agent.epsilon * agent.epsilon_decay, agent.epsilon_min)
+                    reward_log.append(total_reward)
+                    print(f"エピソード {len(reward_log)}/{episodes} 終了 - 累積報酬: {total_reward}")
+                    if len(reward_log) >= episodes:
+                        break
+
+            agent.replay(batch_size=batch_size)
+            steps += 1
+            if steps % sync_interval == 0:
+                send_weights(weight_queues, agent.model.get_weights(), agent.epsilon)
+    finally:
+        stop.set()
+        # 送信待ちの経験が残っていると対戦プロセスが終われないので読み捨てる
+        while any(p.is_alive() for p in processes):
+            try:
+                transitions.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for p in processes:
+            p.join()
+
+    # モデルを保存
+    agent.save("ver1_fixed.keras")
+    print("モデルを保存しました。")
+
+    return reward_log
+
+#最新の重みを各対戦プロセスに送る(まだ読まれていない古い重みは捨てる)
+def send_weights(weight_queues, weights, epsilon):
+    for q in weight_queues:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            pass
+        q.put((weights, epsilon))
+
+#対戦プロセス 学習側から重みが届いたら差し替えながら、止められるまで自己対戦を続ける
+def actor_loop(actor_id, num_envs, transitions, weight_queue, stop):
+    agent = DQNAgent((8, 8), 64, memory_size=1)
+    env = OthelloVecEnv(num_envs, seed=actor_id)
+    episode_rewards = np.zeros(num_envs, dtype=np.float32)
+    while True:
+        try:
+            weights, agent.epsilon = weight_queue.get(timeout=0.1)
+            break
+        except queue.Empty:
+            if stop.is_set():
+                return
+    agent.model.set_weights(weights)
+
+    while not stop.is_set():
+        try:
+            weights, agent.epsilon = weight_queue.get_nowait()
+            agent.model.set_weights(weights)
+        except queue.Empty:
+            pass
+
+        item = play_step(agent, env, episode_rewards)
+        while not stop.is_set():
+            try:
+                transitions.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
 #報酬ログ
 def plot_rewards(reward_log):
+    import matplotlib.pyplot as plt
     plt.plot(reward_log)
     plt.xlabel('Episode')
     plt.ylabel('Cumulative Reward')
@@ -105,8 +190,24 @@ def plot_rewards(reward_log):
     plt.show()
 
 if __name__ == "__main__":
-    episodes = 100  
-    reward_log = train_dqn(episodes=episodes)
+    parser = argparse.ArgumentParser(description="DQNで自己対戦して学習する")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--num-envs", type=int, default=16, help="1つのプロセスで同時に進める局数")
+    parser.add_argument("--actors", type=int, default=0, help="1以上なら対戦プロセスを分けて並列に学習する")
+    parser.add_argument("--sync-interval", type=int, default=50, help="何回学習するごとに対戦プロセスへ重みを送るか")
+    parser.add_argument("--augment", action="store_true", help="回転・反転した盤面でも学習する")
+    parser.add_argument("--no-plot", action="store_true", help="報酬ログをプロットしない")
+    args = parser.parse_args()
+
+    if args.actors > 0:
+        reward_log = train_dqn_parallel(args.episodes, batch_size=args.batch_size, actors=args.actors,
+                                        num_envs=args.num_envs, sync_interval=args.sync_interval,
+                                        augment=args.augment)
+    else:
+        reward_log = train_dqn(episodes=args.episodes, batch_size=args.batch_size, num_envs=args.num_envs,
+                               augment=args.augment)
 
     # 報酬ログをプロット
-    plot_rewards(reward_log)
+    if not args.no_plot:
+        plot_rewards(reward_log)
@@ -0,0 +1,107 @@
+import random
+from array import array
+
+#置換表(トランスポジションテーブル)とZobristハッシュ
+#同じ局面に別の手順で到達したときに探索結果を使い回す
+
+#評価値の種類
+EXACT = 1  # 正確な値
+LOWER = 2  # 下限(beta以上でカット)
+UPPER = 3  # 上限(alpha以下)
+
+NO_MOVE = -1
+
+#1エントリあたりのバイト数(キー8 + 深さ1 + 種類1 + 評価値4 + 手1 + 世代1)
+ENTRY_BYTES = 16
+
+#Zobristハッシュ用の乱数(シードを固定してプロセス間で同じ値にする)
+_rng = random.Random(20240124)
+ZOBRIST_WHITE = [_rng.getrandbits(64) for _ in range(64)]
+ZOBRIST_BLACK = [_rng.getrandbits(64) for _ in range(64)]
+#ひっくり返った石は白黒両方のキーが入れ替わる
+ZOBRIST_FLIP = [w ^ b for w, b in zip(ZOBRIST_WHITE, ZOBRIST_BLACK)]
+ZOBRIST_SIDE = _rng.getrandbits(64)  # 手番が黒のときにXORする
+
+
+#盤面と手番からハッシュ値を計算
+def zobrist_hash(board, player):
+    key = 0
+    for sq in range(64):
+        bit = 1 << sq
+        if board.white & bit:
+            key ^= ZOBRIST_WHITE[sq]
+        elif board.black & bit:
+            key ^= ZOBRIST_BLACK[sq]
+    if player == -1:
+        key ^= ZOBRIST_SIDE
+    return key
+
+
+#sqにplayerが打ってflipsが返ったあとのハッシュ値(手番も交代する)
+def update_hash(key, sq, flips, player):
+    key ^= (ZOBRIST_WHITE if player == 1 else ZOBRIST_BLACK)[sq]
+    while flips:
+        lsb = flips & -flips
+        key ^= ZOBRIST_FLIP[lsb.bit_length() - 1]
+        flips ^= lsb
+    return key ^ ZOBRIST_SIDE
+
+
+#パスしたときのハッシュ値
+def pass_hash(key):
+    return key ^ ZOBRIST_SIDE
+
+
+#メモリ上限つきの置換表
+#スロット数は2のべき乗で固定し、各項目を型付き配列で持つ
+#置き換えは「空き・同じ局面・古い世代・深さが同じか深い」場合に行う(深さ優先+世代)
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        slots = 1
+        while slots * 2 * ENTRY_BYTES <= size_mb * 1024 * 1024:
+            slots *= 2
+        self.size = slots
+        self.mask = slots - 1
+        self.generation = 0
+        self.clear()
+
+    #全エントリを消去
+    def clear(self):
+        n = self.size
+        self.keys = array("Q", bytes(8 * n))
+        self.depths = array("b", bytes(n))
+        self.flags = array("B", bytes(n))
+        self.values = array("i", bytes(4 * n))
+        self.moves = array("b", bytes(n))
+        self.generations = array("B", bytes(n))
+
+    #新しい探索を始める(前の探索のエントリは置き換えやすくなる)
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    #局面を引く (深さ, 種類, 評価値, 手) を返し、なければNone
+    def probe(self, key):
+        i = key & self.mask
+        if self.flags[i] and self.keys[i] == key:
+            return self.depths[i], self.flags[i], self.values[i], self.moves[i]
+        return None
+
+    #局面を保存
+    def store(self, key, depth, flag, value, move=NO_MOVE):
+        i = key & self.mask
+        if self.flags[i]:
+            if self.keys[i] == key:
+                if move == NO_MOVE:
+                    move = self.moves[i]
+            elif self.generations[i] == self.generation and self.depths[i] > depth:
+                return
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.flags[i] = flag
+        self.values[i] = value
+        self.moves[i] = move
+        self.generations[i] = self.generation
+
+    #使用中のスロット数
+    def used(self):
+        return self.size - self.flags.count(0)